@@ -0,0 +1,187 @@
+"""
+Online snapshots, restores and JSON Lines dumps of the task database.
+
+Snapshots use the sqlite3 backup API, copying a bounded number of pages per
+step and sleeping in between so the app keeps serving requests. In WAL mode
+(DB_PROFILE=production) the whole copy runs inside one read transaction,
+which gives a consistent snapshot that writers never wait for. Without WAL,
+writers get in between steps instead, and SQLite restarts the copy if they
+change the database.
+
+JSON Lines dumps keep every table, id and foreign key, so they can move all
+the data to another instance, including one on a different database.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+from datetime import date, datetime
+from sqlalchemy import select, text
+from sync import TRACKED_TABLES, json_value
+
+
+def sqlite_path(engine):
+    """Path of the SQLite file behind engine, or None for other databases"""
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return None
+    return engine.url.database
+
+
+def snapshot(db_path, dest, compress=False, pages=1024, sleep=0.005):
+    """Copy the live database at db_path to dest (gzipped if compress).
+
+    The file only appears at dest once it is complete. Returns its size in bytes.
+    """
+    partial = dest + '.part'
+    raw = partial + '.db' if compress else partial
+    source = sqlite3.connect(db_path, timeout=30)
+    target = sqlite3.connect(raw)
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            # Pin one snapshot of the database for every step of the copy
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
+    if compress:
+        with open(raw, 'rb') as plain, gzip.open(partial, 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(plain, packed, 1024 * 1024)
+        os.remove(raw)
+    os.replace(partial, dest)
+    return os.path.getsize(dest)
+
+
+def restore(snapshot_path, db_path):
+    """Replace the contents of the live database at db_path with a snapshot.
+
+    The snapshot is unpacked and checked next to the database first, then
+    copied in with a single backup step: one write transaction, so every
+    connection in every worker goes from the old data to the new at once
+    and none is left reading a replaced file. Change versions carry on from
+    the live database's (see carry_change_versions()), so mirroring clients
+    pick the restored data up as ordinary changes.
+    """
+    staged = db_path + '.restore'
+    if snapshot_path.endswith('.gz'):
+        with gzip.open(snapshot_path, 'rb') as packed, open(staged, 'wb') as plain:
+            shutil.copyfileobj(packed, plain, 1024 * 1024)
+    else:
+        shutil.copyfile(snapshot_path, staged)
+
+    source = sqlite3.connect(staged)
+    try:
+        check = source.execute('PRAGMA integrity_check').fetchone()[0]
+        if check != 'ok':
+            raise ValueError(f"{snapshot_path} is not a usable snapshot: {check}")
+        if not source.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task'").fetchone():
+            raise ValueError(f"{snapshot_path} is not a task database")
+        carry_change_versions(source, db_path)
+        target = sqlite3.connect(db_path, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+        os.remove(staged)
+
+
+def carry_change_versions(staged, db_path):
+    """Renumber a staged restore's change versions to follow on from the live database's.
+
+    Restoring would otherwise wind the change counter back, and clients
+    that had seen later versions would get nothing until it caught up.
+    Every restored row gets a new version and every row only the live
+    database has gets a tombstone, so a client's next sync brings its
+    mirror in line with the snapshot.
+    """
+    staged.execute('ATTACH DATABASE ? AS live', (db_path,))
+    try:
+        has_state = "SELECT 1 FROM {}.sqlite_master WHERE type = 'table' AND name = 'sync_state'"
+        if not (staged.execute(has_state.format('main')).fetchone() and staged.execute(has_state.format('live')).fetchone()):
+            return
+        with staged:
+            version = max(staged.execute('SELECT version FROM main.sync_state WHERE id = 1').fetchone()[0],
+                          staged.execute('SELECT version FROM live.sync_state WHERE id = 1').fetchone()[0])
+            for name in TRACKED_TABLES:
+                staged.execute(f'UPDATE main.{name} SET version = ? + id', (version,))
+                version += staged.execute(f'SELECT coalesce(max(id), 0) FROM main.{name}').fetchone()[0]
+                staged.execute(f"""INSERT INTO main.sync_tombstone (version, entity, entity_id)
+                    SELECT ? + row_number() OVER (ORDER BY id), '{name}', id FROM live.{name}
+                    WHERE id NOT IN (SELECT id FROM main.{name})""", (version,))
+                version += staged.execute('SELECT changes()').fetchone()[0]
+            staged.execute('UPDATE main.sync_state SET version = ? WHERE id = 1', (version,))
+    finally:
+        staged.execute('DETACH DATABASE live')
+
+
+def dump_jsonl(session, tables, chunk_size=1000):
+    """Yield every row of tables, in order, as JSON lines of {"table": ..., "row": {...}}"""
+    for table in tables:
+        result = session.execute(select(table).order_by(*table.primary_key.columns)
+                                              .execution_options(yield_per=chunk_size))
+        for rows in result.mappings().partitions():
+            yield ''.join(json.dumps({'table': table.name,
+                                      'row': {key: json_value(value) for key, value in row.items()}},
+                                     separators=(',', ':')) + '\n'
+                          for row in rows)
+
+
+def load_jsonl(connection, lines, tables, batch_size=1000):
+    """Insert rows from dump_jsonl() lines into an empty database, keeping their ids.
+
+    tables maps table names to Table objects. Rows are inserted in batches on
+    connection, inside the caller's transaction; the target's triggers give
+    them new change versions. Returns {table name: rows}.
+    """
+    converters = {}
+    for table in tables.values():
+        for column in table.columns:
+            try:
+                python_type = column.type.python_type
+            except NotImplementedError:
+                python_type = None
+            if python_type in (date, datetime):
+                converters[table.name, column.name] = python_type.fromisoformat
+
+    counts = {}
+    batch_table, batch = None, []
+
+    def flush():
+        if batch:
+            connection.execute(batch_table.insert(), batch)
+            counts[batch_table.name] = counts.get(batch_table.name, 0) + len(batch)
+            batch.clear()
+
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        table = tables.get(record.get('table'))
+        if table is None:
+            raise ValueError(f"Unknown table in dump: {record.get('table')!r}")
+        if table is not batch_table:
+            flush()
+            batch_table = table
+        row = record['row']
+        for name, value in row.items():
+            convert = converters.get((table.name, name))
+            if convert and value is not None:
+                row[name] = convert(value)
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    if connection.dialect.name == 'postgresql':
+        # Explicit ids leave the serial sequences behind; move them past the loaded rows
+        for name in counts:
+            if 'id' in tables[name].columns:
+                connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                                        f"coalesce(max(id), 1)) FROM {name}"))
+    return counts
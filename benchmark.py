@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for DB_tasks.
+
+Builds a throwaway database filled with synthetic projects, tasks and timer
+sessions, then measures:
+
+- every route through the Flask test client (latency percentiles and SQL
+  queries per request)
+- a concurrent load mix across several worker processes
+- import_todoist.py on a large synthetic Todoist export
+- startup: importing tasks.py, building the app and serving the first
+  request, each in a fresh interpreter
+
+Usage:
+    python benchmark.py --scale 100k --output results.json
+    python benchmark.py --scale 1k --baseline results.json --threshold 0.25
+
+Scales: 1k, 100k and 1m tasks. With --baseline, the run fails (exit code 1)
+if any route's median latency grows by more than the threshold or it issues
+more queries than before.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+BATCH_SIZE = 10_000
+
+WORDS = ('write review plan email call fix read draft prepare send book update clean '
+         'check order pay submit sort grade meet research report paper budget slides '
+         'invoice grant lecture thesis garden car dentist taxes groceries').split()
+
+
+ROOT = Path(__file__).resolve().parent
+
+
+def load_app(database_path, page_cache):
+    """Build the web app pointed at the benchmark database, creating its schema"""
+    sys.path.insert(0, str(ROOT))
+    from tasks import create_app
+    from models import db, init_schema
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database_path}',
+                      'PAGE_CACHE_BACKEND': 'local' if page_cache else 'none'})
+    with app.app_context():
+        init_schema(db.engine)
+    return app
+
+
+def random_name(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+
+
+def seed_database(app, n_tasks, seed=0):
+    """Fill Project, Task and Timer with reproducible synthetic data"""
+    from models import db, Project, Task, Timer, rebuild_timer_rollups
+
+    rng = random.Random(seed)
+    today = date.today()
+    now = datetime.now()
+
+    with app.app_context():
+        n_projects = max(5, min(200, n_tasks // 500))
+        db.session.execute(Project.__table__.insert(), [
+            {'name': f'project-{i}', 'color': f'#{rng.randrange(0x1000000):06x}', 'created_at': now}
+            for i in range(n_projects)
+        ])
+
+        for start in range(0, n_tasks, BATCH_SIZE):
+            rows = []
+            for _ in range(min(BATCH_SIZE, n_tasks - start)):
+                due = today + timedelta(days=rng.randint(-365, 365)) if rng.random() < 0.6 else None
+                rows.append({
+                    'name': random_name(rng),
+                    'completed': rng.random() < 0.6,
+                    'created_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 730)),
+                    'do_date': due - timedelta(days=rng.randint(0, 7)) if due and rng.random() < 0.5 else None,
+                    'due_date': due,
+                    'priority': rng.randint(0, 3),
+                    'project_id': rng.randint(1, n_projects) if rng.random() < 0.8 else None,
+                })
+            db.session.execute(Task.__table__.insert(), rows)
+            db.session.commit()
+
+        n_timers = max(20, n_tasks // 10)
+        for start in range(0, n_timers, BATCH_SIZE):
+            rows = []
+            for _ in range(min(BATCH_SIZE, n_timers - start)):
+                started = now - timedelta(minutes=rng.randint(0, 60 * 24 * 730))
+                planned = rng.choice((10, 25, 30))
+                actual = max(1, planned + rng.randint(-5, 5))
+                rows.append({
+                    'start_time': started,
+                    'end_time': started + timedelta(minutes=actual),
+                    'duration_minutes': actual,
+                    'planned_minutes': planned,
+                    'notes': random_name(rng) if rng.random() < 0.5 else None,
+                    'date': started.date(),
+                })
+            db.session.execute(Timer.__table__.insert(), rows)
+            db.session.commit()
+
+        rebuild_timer_rollups()
+        return n_projects, n_timers
+
+
+class Context:
+    """Ids handed out to routes that need an existing row"""
+
+    def __init__(self, app, seed=1, partition=(0, 1)):
+        from models import db, Project, Task
+
+        self.rng = random.Random(seed)
+        index, parts = partition  # concurrent workers each take their own slice of tasks
+        with app.app_context():
+            self.open_ids = [row[0] for row in db.session.query(Task.id).filter(Task.completed == False)
+                             if row[0] % parts == index]
+            self.project_ids = [row[0] for row in db.session.query(Project.id)]
+        self.rng.shuffle(self.open_ids)
+        self.new_projects = 0
+
+    def take_task_id(self):
+        """An open task no other request has completed or deleted"""
+        return self.open_ids.pop()
+
+    def task_id(self):
+        return self.rng.choice(self.open_ids)
+
+    def project_id(self):
+        return self.rng.choice(self.project_ids)
+
+
+def task_form(ctx, name='benchmark task'):
+    return {'task': name, 'do_date': '', 'due_date': '2026-06-01',
+            'priority': str(ctx.rng.randint(0, 3)), 'project_id': str(ctx.project_id())}
+
+
+def new_project_form(ctx):
+    ctx.new_projects += 1
+    return {'name': f'bench-project-{os.getpid()}-{ctx.new_projects}', 'color': '#007bff'}
+
+
+def start_timer(client, ctx):
+    response = client.post('/timer/start', data={'duration': '25'})
+    return response.location.rstrip('/').split('/')[-1]
+
+
+# (name, method, url(ctx, client), form data(ctx) or None)
+READ_ROUTES = [
+    ('GET /', 'GET', lambda ctx, c: '/', None),
+    ('GET /completed', 'GET', lambda ctx, c: '/completed', None),
+    ('GET /projects', 'GET', lambda ctx, c: '/projects', None),
+    ('GET /projects/<id>', 'GET', lambda ctx, c: f'/projects/{ctx.project_id()}', None),
+    ('GET /timer/log', 'GET', lambda ctx, c: '/timer/log', None),
+    ('GET /timer/stats', 'GET', lambda ctx, c: '/timer/stats', None),
+    ('GET /search', 'GET', lambda ctx, c: f'/search?q={ctx.rng.choice(WORDS)}', None),
+    ('GET /export/active', 'GET', lambda ctx, c: '/export/active', None),
+    ('GET /export/completed', 'GET', lambda ctx, c: '/export/completed', None),
+    ('GET /export/timers', 'GET', lambda ctx, c: '/export/timers', None),
+]
+
+WRITE_ROUTES = [
+    ('POST /add', 'POST', lambda ctx, c: '/add', task_form),
+    ('POST /edit/<id>', 'POST', lambda ctx, c: f'/edit/{ctx.task_id()}', lambda ctx: task_form(ctx, 'edited task')),
+    ('GET /complete/<id>', 'GET', lambda ctx, c: f'/complete/{ctx.take_task_id()}', None),
+    ('GET /delete/<id>', 'GET', lambda ctx, c: f'/delete/{ctx.take_task_id()}', None),
+    ('POST /tasks/batch', 'POST', lambda ctx, c: '/tasks/batch',
+     lambda ctx: {'task_ids': [ctx.task_id() for _ in range(50)], 'operation': 'priority', 'priority': '2'}),
+    ('POST /projects/new', 'POST', lambda ctx, c: '/projects/new', new_project_form),
+    ('POST /timer/start', 'POST', lambda ctx, c: '/timer/start', lambda ctx: {'duration': '25'}),
+    ('POST /timer/<id>/complete', 'POST', lambda ctx, c: f'/timer/{start_timer(c, ctx)}/complete',
+     lambda ctx: {'notes': 'benchmark'}),
+]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+    return {
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p90_ms': round(cuts[89] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def run_request(client, ctx, route, before=None):
+    """Issue one request for route, returning (seconds, status code)"""
+    name, method, url, data = route
+    target = url(ctx, client)
+    form = data(ctx) if data else None
+    if before:
+        before()
+    started = time.perf_counter()
+    response = client.open(target, method=method, data=form)
+    response.get_data()  # drain streamed exports
+    elapsed = time.perf_counter() - started
+    response.close()
+    return elapsed, response.status_code
+
+
+def bench_routes(app, iterations):
+    """Time every route and count the SQL statements each request issues"""
+    from sqlalchemy import event
+    from models import db
+
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    def reset():
+        queries[0] = 0
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    client = app.test_client()
+    ctx = Context(app)
+    results = {}
+    try:
+        for route in READ_ROUTES + WRITE_ROUTES:
+            name = route[0]
+            samples, counts, errors = [], [], 0
+            run_request(client, ctx, route)  # warm up
+            for _ in range(iterations):
+                elapsed, status = run_request(client, ctx, route, before=reset)
+                samples.append(elapsed)
+                counts.append(queries[0])
+                errors += status >= 400
+            results[name] = dict(percentiles(samples), queries=max(counts), errors=errors)
+            print(f"  {name:28} p50 {results[name]['p50_ms']:9.2f} ms   p99 {results[name]['p99_ms']:9.2f} ms"
+                  f"   {results[name]['queries']} queries")
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count)
+    return results
+
+
+def _load_worker(args):
+    database_path, page_cache, duration, seed, workers = args
+    app = load_app(database_path, page_cache)
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)  # don't share pooled connections across the fork
+
+    client = app.test_client()
+    ctx = Context(app, seed, partition=(seed, workers))
+    mix = READ_ROUTES[:7] * 4 + WRITE_ROUTES  # mostly reads, some writes
+    samples, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        try:
+            elapsed, status = run_request(client, ctx, ctx.rng.choice(mix))
+            samples.append(elapsed)
+            errors += status >= 400
+        except Exception:
+            errors += 1
+    return samples, errors
+
+
+def bench_load(database_path, page_cache, workers, duration):
+    """Run a read-heavy route mix from several processes at once"""
+    jobs = [(database_path, page_cache, duration, seed, workers) for seed in range(workers)]
+    with multiprocessing.Pool(workers) as pool:
+        outcomes = pool.map(_load_worker, jobs)
+    samples = [s for worker_samples, _ in outcomes for s in worker_samples]
+    errors = sum(e for _, e in outcomes)
+    result = dict(percentiles(samples), workers=workers, requests=len(samples), errors=errors,
+                  requests_per_sec=round(len(samples) / duration, 1))
+    print(f"  {workers} workers: {result['requests_per_sec']} req/s, p50 {result['p50_ms']} ms, "
+          f"p99 {result['p99_ms']} ms, {errors} errors")
+    return result
+
+
+def write_todoist_csv(path, n_rows, seed=2):
+    rng = random.Random(seed)
+    header = ['TYPE', 'CONTENT', 'DESCRIPTION', 'IS_COLLAPSED', 'PRIORITY', 'INDENT', 'AUTHOR', 'RESPONSIBLE',
+              'DATE', 'DATE_LANG', 'TIMEZONE', 'DURATION', 'DURATION_UNIT', 'DEADLINE', 'DEADLINE_LANG', 'PROJECT']
+    dates = ['', '', '14-Jan-26', '2026-03-04', '04/03/2026', 'every day']
+    projects = ['work', 'personal', 'teaching', 'reading', 'Inbox', '']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, header)
+        writer.writeheader()
+        for _ in range(n_rows):
+            writer.writerow({'TYPE': 'task', 'CONTENT': random_name(rng), 'PRIORITY': str(rng.randint(1, 4)),
+                             'DATE': rng.choice(dates), 'PROJECT': rng.choice(projects)})
+
+
+def bench_import(database_path, workdir, n_rows):
+    """Time import_todoist.py on a synthetic export"""
+    import import_todoist
+
+    export = Path(workdir) / 'todoist_bench.csv'
+    write_todoist_csv(export, n_rows)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import_todoist.import_todoist_data([str(export)], url=f'sqlite:///{database_path}')
+    elapsed = time.perf_counter() - started
+    result = {'rows': n_rows, 'seconds': round(elapsed, 3), 'rows_per_sec': round(n_rows / elapsed, 1)}
+    print(f"  {n_rows} rows in {result['seconds']} s ({result['rows_per_sec']:,.0f} rows/sec)")
+    return result
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import tasks
+imported = time.perf_counter()
+app = tasks.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'PAGE_CACHE_BACKEND': 'none'})
+created = time.perf_counter()
+status = app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created, 'status': status}))
+"""
+
+
+def bench_startup(database_path, runs):
+    """Time a cold start (import, create_app, first request) in fresh interpreters"""
+    samples = {'import': [], 'create_app': [], 'first_request': [], 'process': []}
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, f'sqlite:///{database_path}'],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        samples['process'].append(time.perf_counter() - started)
+        timings = json.loads(output)
+        if timings.pop('status') != 200:
+            raise RuntimeError("first request after startup failed")
+        for name, seconds in timings.items():
+            samples[name].append(seconds)
+    result = {f'{name}_ms': round(statistics.median(values) * 1000, 3) for name, values in samples.items()}
+    result['runs'] = runs
+    print(f"  import {result['import_ms']} ms, create_app {result['create_app_ms']} ms, "
+          f"first request {result['first_request_ms']} ms, whole process {result['process_ms']} ms")
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Return a list of regressions against a previous results file"""
+    regressions = []
+    for name, current in results.get('routes', {}).items():
+        previous = baseline.get('routes', {}).get(name)
+        if not previous:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p50 {previous['p50_ms']} ms -> {current['p50_ms']} ms")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+    for section, key in (('import', 'rows_per_sec'), ('load', 'requests_per_sec')):
+        if section in results and section in baseline:
+            if results[section][key] < baseline[section][key] / (1 + threshold):
+                regressions.append(f"{section}: {key} {baseline[section][key]} -> {results[section][key]}")
+    if 'startup' in results and 'startup' in baseline:
+        for key in ('import_ms', 'first_request_ms'):
+            if results['startup'][key] > baseline['startup'][key] * (1 + threshold):
+                regressions.append(f"startup: {key} {baseline['startup'][key]} -> {results['startup'][key]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DB_tasks routes and the Todoist importer.")
+    parser.add_argument('--scale', choices=SCALES, default='1k', help="number of synthetic tasks (default: 1k)")
+    parser.add_argument('--iterations', type=int, default=30, help="requests per route (default: 30)")
+    parser.add_argument('--workers', type=int, default=4, help="processes for the load test, 0 to skip (default: 4)")
+    parser.add_argument('--duration', type=float, default=10, help="seconds for the load test (default: 10)")
+    parser.add_argument('--import-rows', type=int, default=100_000, help="rows in the import test, 0 to skip")
+    parser.add_argument('--startup-runs', type=int, default=5, help="cold starts to time, 0 to skip (default: 5)")
+    parser.add_argument('--cache', action='store_true', help="leave the page cache on")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="previous results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown vs baseline (default: 0.25)")
+    parser.add_argument('--keep', action='store_true', help="keep the work directory with the seeded database")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='db_tasks_bench_')
+    try:
+        return run(args, workdir)
+    finally:
+        if args.keep:
+            print(f"\nWork directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args, workdir):
+    """Seed a database in workdir and run the selected benchmarks; returns the exit status"""
+    database_path = os.path.join(workdir, 'bench.db')
+    app = load_app(database_path, args.cache)
+    n_tasks = SCALES[args.scale]
+
+    print(f"Seeding {n_tasks:,} tasks into {database_path}...")
+    started = time.perf_counter()
+    n_projects, n_timers = seed_database(app, n_tasks, args.seed)
+    print(f"  done in {time.perf_counter() - started:.1f} s ({n_projects} projects, {n_timers:,} timers)")
+
+    results = {
+        'meta': {
+            'scale': args.scale, 'tasks': n_tasks, 'projects': n_projects, 'timers': n_timers,
+            'iterations': args.iterations, 'page_cache': args.cache,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+        },
+    }
+
+    print("\nRoutes:")
+    results['routes'] = bench_routes(app, args.iterations)
+
+    if args.workers:
+        print("\nConcurrent load:")
+        results['load'] = bench_load(database_path, args.cache, args.workers, args.duration)
+
+    if args.import_rows:
+        print("\nTodoist import:")
+        results['import'] = bench_import(database_path, workdir, args.import_rows)
+
+    if args.startup_runs:
+        print("\nStartup:")
+        results['startup'] = bench_startup(database_path, args.startup_runs)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,35 +1,64 @@
 #!/usr/bin/env python3
 """
-Script to import Todoist CSV export into DB_tasks database.
+Script to import Todoist CSV exports into DB_tasks database.
 
 Usage:
 1. Place this script in your task-manager folder (same directory as tasks.py)
-2. Place the todoist_exp_all.csv file in the same folder
-3. Make sure your Flask app is NOT running
-4. Run: python import_todoist.py
+2. Make sure your Flask app is NOT running
+3. Create the database if needed: flask --app tasks init-db
+4. Run: python import_todoist.py [FILE_OR_DIR ...] [--batch-size N] [--database URL]
+
+With no arguments, todoist_exp_all.csv in the current directory is imported.
+Directories are searched for *.csv files. Each file is read in a single
+streaming pass and tasks are inserted in batches, committing after each one.
+The database is opened directly through the models, without the web app.
 """
 
+import argparse
 import csv
 import sys
-from datetime import datetime, timezone
+import time
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
 
 # Add the current directory to Python path so we can import our models
 sys.path.append('.')
 
 try:
-    from models import db, Task, Project
-    from tasks import app  # Import the Flask app
+    from models import Task, Project
+    from config import database_url, load_config
+    from page_cache import SQLiteCacheBackend
+    from search import bulk_insert_tasks
 except ImportError as e:
     print(f"Error: Could not import models. Make sure you're running this from your task-manager directory.")
     print(f"Import error: {e}")
     sys.exit(1)
 
+DEFAULT_FILE = 'todoist_exp_all.csv'
+DEFAULT_BATCH_SIZE = 5000
+
+# Color mapping for projects (you can customize this)
+PROJECT_COLORS = {
+    'work': '#007bff', 'engagement': '#28a745', 'personal': '#6f42c1',
+    'to-read': '#ffc107', 'CELGAI': '#dc3545', 'creative-tinkering': '#20c997',
+    'funding': '#fd7e14', 'life-admin': '#6c757d', 'teaching': '#e83e8c',
+    'supervision': '#17a2b8', 'Discovery': '#343a40', 'someday': '#868e96',
+    'Inbox': '#00cc33', 'reading': '#ffcc00', 'book': '#ff6666',
+    'home_stuff': '#66ccff'
+}
+
+@lru_cache(maxsize=4096)
 def parse_todoist_date(date_str):
-    """Parse Todoist date formats into Python date objects"""
+    """Parse Todoist date formats into Python date objects.
+
+    Exports repeat the same handful of dates many times, so results are cached.
+    """
     if not date_str or date_str.strip() == '':
         return None
-    
+
     # Common Todoist date formats
     formats = [
         '%d-Jan-%y',    # 14-Jan-26
@@ -37,9 +66,9 @@ def parse_todoist_date(date_str):
         '%Y-%m-%d',     # 2026-01-14
         '%d/%m/%Y',     # 14/01/2026
     ]
-    
+
     date_str = date_str.strip()
-    
+
     for fmt in formats:
         try:
             parsed_date = datetime.strptime(date_str, fmt)
@@ -49,7 +78,7 @@ def parse_todoist_date(date_str):
             return parsed_date.date()
         except ValueError:
             continue
-    
+
     print(f"Warning: Could not parse date: '{date_str}'")
     return None
 
@@ -57,128 +86,152 @@ def convert_todoist_priority(todoist_priority):
     """Convert Todoist priority (1-4) to our priority (0-3)"""
     if not todoist_priority or todoist_priority == '':
         return 0
-    
+
     # Todoist: 1=lowest, 4=highest
     # Ours: 0=none, 1=low, 2=medium, 3=high
     priority_map = {
         '1': 1,  # Low
-        '2': 1,  # Low  
+        '2': 1,  # Low
         '3': 2,  # Medium
         '4': 3,  # High
     }
-    
+
     return priority_map.get(str(todoist_priority), 0)
 
-def import_todoist_data():
+def find_csv_files(paths):
+    """Expand the given files and directories into a list of CSV files"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob('*.csv')))
+        elif path.exists():
+            files.append(path)
+        else:
+            print(f"Warning: {path} not found, skipping")
+    return files
+
+def get_project_id(session, name, projects, created):
+    """Return the id of the named project, creating it on first sight"""
+    if name not in projects:
+        color = PROJECT_COLORS.get(name, '#00cc33')
+        project = Project(name=name, color=color)
+        session.add(project)
+        session.flush()
+        projects[name] = project.id
+        created.append(name)
+        print(f"Creating project: {name} ({color})")
+    return projects[name]
+
+def shared_page_cache():
+    """The web app's shared page cache, if it uses one, so imported tasks show up straight away"""
+    config = load_config()
+    if config['PAGE_CACHE_BACKEND'] != 'shared' or not Path(config['PAGE_CACHE_PATH']).exists():
+        return None
+    return SQLiteCacheBackend(config['PAGE_CACHE_PATH'])
+
+def import_todoist_data(paths=None, batch_size=DEFAULT_BATCH_SIZE, url=None):
     """Main import function"""
-    
-    csv_file = Path('todoist_exp_all.csv')
-    if not csv_file.exists():
-        print("Error: todoist_exp_all.csv not found in current directory")
+
+    csv_files = find_csv_files(paths or [DEFAULT_FILE])
+    if not csv_files:
+        print("Error: no Todoist CSV files to import")
+        return
+
+    engine = create_engine(url or database_url())
+    if not inspect(engine).has_table(Task.__tablename__):
+        print("Error: the database has no tables yet. Run: flask --app tasks init-db")
         return
-    
-    with app.app_context():
-        # First, let's see what projects we need
-        projects_needed = set()
-        
-        print("Analyzing CSV file...")
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['TYPE'] == 'task' and row['PROJECT']:
-                    projects_needed.add(row['PROJECT'])
-        
-        print(f"Found {len(projects_needed)} projects in Todoist:")
-        for project in sorted(projects_needed):
-            print(f"  - {project}")
-        
-        # Color mapping for projects (you can customize this)
-        project_colors = {
-            'work': '#007bff', 'engagement': '#28a745', 'personal': '#6f42c1',
-            'to-read': '#ffc107', 'CELGAI': '#dc3545', 'creative-tinkering': '#20c997',
-            'funding': '#fd7e14', 'life-admin': '#6c757d', 'teaching': '#e83e8c',
-            'supervision': '#17a2b8', 'Discovery': '#343a40', 'someday': '#868e96',
-            'Inbox': '#00cc33', 'reading': '#ffcc00', 'book': '#ff6666',
-            'home_stuff': '#66ccff'
-        }
-        
-        # Create projects that don't exist
-        existing_projects = {p.name: p for p in Project.query.all()}
-        
-        for project_name in projects_needed:
-            if project_name not in existing_projects:
-                color = project_colors.get(project_name, '#00cc33')
-                project = Project(name=project_name, color=color)
-                db.session.add(project)
-                print(f"Creating project: {project_name} ({color})")
-        
-        db.session.commit()
-        
-        # Refresh project list
-        existing_projects = {p.name: p for p in Project.query.all()}
-        
-        # Now import tasks
-        print("\nImporting tasks...")
+
+    page_cache = shared_page_cache()
+
+    with Session(engine) as session:
+        projects = dict(session.query(Project.name, Project.id).all())
+        projects_created = []
+
         tasks_imported = 0
         tasks_skipped = 0
-        
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['TYPE'] != 'task':
-                    continue
-                
-                task_name = row['CONTENT'].strip()
-                if not task_name:
-                    tasks_skipped += 1
-                    continue
-                
-                # Parse dates
-                due_date = parse_todoist_date(row['DATE']) or parse_todoist_date(row['DEADLINE'])
-                
-                # Convert priority
-                priority = convert_todoist_priority(row['PRIORITY'])
-                
-                # Get project
-                project_id = None
-                if row['PROJECT'] and row['PROJECT'] in existing_projects:
-                    project_id = existing_projects[row['PROJECT']].id
-                
-                # Create task
-                task = Task(
-                    name=task_name,
-                    due_date=due_date,
-                    priority=priority,
-                    project_id=project_id,
-                    completed=False  # Import all as active tasks
-                )
-                
-                db.session.add(task)
-                tasks_imported += 1
-                
-                if tasks_imported % 10 == 0:
-                    print(f"  Imported {tasks_imported} tasks...")
-        
-        db.session.commit()
-        
+        batch = []
+        started = time.perf_counter()
+
+        def flush_batch():
+            # One Core executemany per batch, search-indexed in one statement and
+            # committed so the session never grows
+            nonlocal tasks_imported
+            if not batch:
+                return
+            bulk_insert_tasks(session, Task.__table__, batch)
+            session.commit()
+            if page_cache:
+                page_cache.bump()
+            tasks_imported += len(batch)
+            batch.clear()
+            elapsed = time.perf_counter() - started
+            print(f"  Imported {tasks_imported} tasks ({tasks_imported / elapsed:,.0f} rows/sec)")
+
+        for csv_file in csv_files:
+            print(f"\nImporting tasks from {csv_file}...")
+            with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    if row['TYPE'] != 'task':
+                        continue
+
+                    task_name = row['CONTENT'].strip()
+                    if not task_name:
+                        tasks_skipped += 1
+                        continue
+
+                    # Parse dates
+                    due_date = parse_todoist_date(row['DATE']) or parse_todoist_date(row['DEADLINE'])
+
+                    # Get project
+                    project_id = None
+                    if row['PROJECT']:
+                        project_id = get_project_id(session, row['PROJECT'], projects, projects_created)
+
+                    batch.append({
+                        'name': task_name,
+                        'due_date': due_date,
+                        'priority': convert_todoist_priority(row['PRIORITY']),
+                        'project_id': project_id,
+                        'completed': False,  # Import all as active tasks
+                    })
+
+                    if len(batch) >= batch_size:
+                        flush_batch()
+
+        flush_batch()
+        session.commit()  # Projects created after the last batch
+        if page_cache:
+            page_cache.bump()
+
+        elapsed = time.perf_counter() - started
         print(f"\nImport complete!")
         print(f"  Tasks imported: {tasks_imported}")
         print(f"  Tasks skipped: {tasks_skipped}")
-        print(f"  Projects created: {len(projects_needed - set(existing_projects.keys()))}")
+        print(f"  Projects created: {len(projects_created)}")
+        print(f"  Time: {elapsed:.2f}s ({tasks_imported / elapsed if elapsed else 0:,.0f} rows/sec)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import Todoist CSV exports into DB_tasks.")
+    parser.add_argument('paths', nargs='*', help=f"CSV files or directories of CSV files (default: {DEFAULT_FILE})")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"tasks inserted per transaction (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--database', help="SQLAlchemy database URL (default: DATABASE_URL or instance/tasks.db)")
+    args = parser.parse_args(argv)
 
-if __name__ == '__main__':
     print("Todoist Import Script")
     print("====================")
-    
-    response = input("This will add data to your database. Continue? (y/N): ")
-    if response.lower() != 'y':
-        print("Import cancelled.")
-        sys.exit(0)
-    
+
     try:
-        import_todoist_data()
+        import_todoist_data(args.paths, max(1, args.batch_size), args.database)
         print("\nDone! You can now start your Flask app to see the imported tasks.")
     except Exception as e:
         print(f"Error during import: {e}")
         import traceback
         traceback.print_exc()
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Opt-in per-request instrumentation.
+
+When INSTRUMENTATION is enabled, every request records how many SQL
+statements it ran, how long they took and how long template rendering took.
+The numbers are reported in a Server-Timing header (visible in browser dev
+tools). Statements slower than SLOW_QUERY_MS are logged with their SQL, and
+per-route latency histograms are served in Prometheus text format at
+/metrics. Metrics are kept per process and app.
+
+When disabled, no hooks are registered at all.
+"""
+
+import bisect
+import threading
+import time
+from functools import partial
+from flask import Response, current_app, g, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    """Latency histograms and SQL/template totals for one app"""
+
+    def __init__(self, slow_query_seconds, logger):
+        self.slow_query_seconds = slow_query_seconds
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.latency = {}  # (endpoint, method) -> [bucket counts..., +Inf count, sum]
+        self.totals = {}   # endpoint -> [queries, query seconds, template seconds]
+
+
+class Instrumentation:
+    """Collects SQL and template timings per request, kept per app in app.extensions['instrumentation']"""
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        if not app.config.get('INSTRUMENTATION'):
+            return
+        metrics = Metrics(app.config.get('SLOW_QUERY_MS', 100) / 1000, app.logger)
+        app.extensions['instrumentation'] = metrics
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_query)
+            event.listen(db.engine, 'after_cursor_execute', partial(self._after_query, metrics))
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def _start_request(self):
+        g.instrumentation = {'start': time.perf_counter(), 'queries': 0, 'query_time': 0.0,
+                             'template_time': 0.0, 'template_start': []}
+
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_query(self, metrics, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if elapsed >= metrics.slow_query_seconds:
+            metrics.logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, statement)
+        if has_request_context() and 'instrumentation' in g:
+            g.instrumentation['queries'] += 1
+            g.instrumentation['query_time'] += elapsed
+
+    def _before_render(self, sender, template, context, **extra):
+        if 'instrumentation' in g:
+            g.instrumentation['template_start'].append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if 'instrumentation' in g and g.instrumentation['template_start']:
+            started = g.instrumentation['template_start'].pop()
+            g.instrumentation['template_time'] += time.perf_counter() - started
+
+    def _finish_request(self, response):
+        stats = g.pop('instrumentation', None)
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        total = time.perf_counter() - stats['start']
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;desc="{stats["queries"]} queries";dur={stats["query_time"] * 1000:.2f}',
+            f'render;dur={stats["template_time"] * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        self._observe(request.endpoint or 'unknown', request.method, total, stats)
+        return response
+
+    def _observe(self, endpoint, method, seconds, stats):
+        metrics = current_app.extensions['instrumentation']
+        with metrics.lock:
+            histogram = metrics.latency.setdefault((endpoint, method), [0] * (len(LATENCY_BUCKETS) + 2))
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            histogram[-1] += seconds
+            totals = metrics.totals.setdefault(endpoint, [0, 0.0, 0.0])
+            totals[0] += stats['queries']
+            totals[1] += stats['query_time']
+            totals[2] += stats['template_time']
+
+    def metrics(self):
+        """Prometheus text exposition of the collected metrics"""
+        metrics = current_app.extensions['instrumentation']
+        with metrics.lock:
+            latency = {key: list(values) for key, values in metrics.latency.items()}
+            totals = {key: list(values) for key, values in metrics.totals.items()}
+
+        lines = ['# HELP http_request_duration_seconds Request latency by route.',
+                 '# TYPE http_request_duration_seconds histogram']
+        for (endpoint, method), histogram in sorted(latency.items()):
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram[:-1]):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram[-1]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        for name, index, help_text in (('db_queries_total', 0, 'SQL statements executed by route.'),
+                                       ('db_query_seconds_total', 1, 'Time spent in SQL by route.'),
+                                       ('template_render_seconds_total', 2, 'Time spent rendering templates by route.')):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, values in sorted(totals.items()):
+                value = values[index] if index == 0 else f'{values[index]:.6f}'
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,186 @@
+"""
+Live change notifications over Server-Sent Events.
+
+The change counter kept by sync.py doubles as the broker between worker
+processes: in each process one thread polls it (a single-row read) while any
+stream is open, and when it moves reads the new changes once and fans them
+out to every stream in that process. Writes from any worker or write path
+show up within LIVE_POLL_SECONDS, and an idle dashboard costs an open
+connection and a thread, with no queries or rendering of its own.
+
+Each stream holds its worker thread for as long as it is open, so this needs
+threaded or async workers (gunicorn -k gthread --threads N, or -k gevent);
+under sync workers every open tab ties up a whole worker. Streams also end
+after LIVE_STREAM_SECONDS, and the browser reconnects with Last-Event-ID and
+picks up where it left off, so no connection is held indefinitely.
+
+Something with a real publish/subscribe channel (Redis, Postgres NOTIFY) can
+replace the poller by calling publish() for each change.
+"""
+
+import json
+import queue
+import threading
+import time
+from flask import current_app
+from sync import changes_since, current_version
+
+
+class Subscription:
+    """Queue of changes for one open stream"""
+
+    def __init__(self, size):
+        self.queue = queue.Queue(size)
+        self.overflowed = False
+
+
+class LiveHub:
+    """Flask extension giving each app its own Broadcaster in app.extensions['live']"""
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.extensions['live'] = Broadcaster(app, db)
+
+    @property
+    def broadcaster(self):
+        return current_app.extensions['live']
+
+    def publish(self, change):
+        self.broadcaster.publish(change)
+
+    def stream(self, since=None):
+        return self.broadcaster.stream(since)
+
+
+class Broadcaster:
+    """Fans one app's database changes out to the event streams open in this process"""
+
+    def __init__(self, app, db):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.app = app
+        self.db = db
+        self.poll_seconds = app.config.get('LIVE_POLL_SECONDS', 1.0)
+        self.keepalive_seconds = app.config.get('LIVE_KEEPALIVE_SECONDS', 15)
+        self.stream_seconds = app.config.get('LIVE_STREAM_SECONDS', 300)
+        self.queue_size = app.config.get('LIVE_QUEUE_SIZE', 256)
+        self.batch_size = app.config.get('SYNC_PAGE_SIZE', 500)
+
+    def subscribe(self):
+        """Start receiving changes; call within an app context"""
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            # Started on first use, so it runs in the worker process rather than a pre-fork parent.
+            # It starts from the version as of now, before any backlog the caller reads.
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, args=(current_version(self.db.session),),
+                                                name='live-hub', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, change):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(change)
+            except queue.Full:
+                # A stream this far behind is told to reload instead
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+    def reset_all(self):
+        """Tell every open stream to reload"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            self._subscriptions.clear()
+        for subscription in subscriptions:
+            subscription.overflowed = True
+            try:
+                subscription.queue.put_nowait(None)  # wakes the stream up
+            except queue.Full:
+                pass
+
+    def _poll(self, version):
+        while True:
+            with self._lock:
+                if not self._subscriptions:
+                    self._thread = None
+                    return
+            with self.app.app_context():
+                session = self.db.session
+                try:
+                    latest = current_version(session)
+                    if latest < version:
+                        # The counter went back (a database swapped in by other means); start every stream over
+                        self.reset_all()
+                        version = latest
+                    while latest > version:
+                        changes, has_more = changes_since(session, self.db.metadata, version, self.batch_size)
+                        for change in changes:
+                            self.publish(change)
+                        version = changes[-1]['version'] if changes else latest
+                        if not has_more:
+                            break
+                except Exception:
+                    self.app.logger.exception('Live update poll failed')
+                finally:
+                    session.remove()
+            time.sleep(self.poll_seconds)
+
+    def stream(self, since=None):
+        """SSE text for an open connection: changes after since (if given), then live ones.
+
+        Call within an app context. A client too far behind to catch up from
+        since gets a reset event and should reload. The stream ends after
+        stream_seconds; the browser then reconnects from the last id it saw.
+        """
+        subscription = self.subscribe()
+        version = current_version(self.db.session)
+        backlog, reset = [], False
+        if since is not None:
+            if since > version:
+                reset = True  # since comes from a database that has been replaced
+            else:
+                backlog, reset = changes_since(self.db.session, self.db.metadata, since, self.batch_size)
+        deadline = time.monotonic() + self.stream_seconds
+
+        def generate():
+            try:
+                yield 'retry: 5000\n\n'
+                if reset:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                if since is None:
+                    yield f'id: {version}\n\n'  # so a reconnect resumes from here even if nothing changes
+                for change in backlog:
+                    yield format_event(change)
+                while not subscription.overflowed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    try:
+                        change = subscription.queue.get(timeout=min(self.keepalive_seconds, remaining))
+                    except queue.Empty:
+                        yield ': keepalive\n\n'  # keeps proxies from closing an idle stream
+                        continue
+                    if change is not None:
+                        yield format_event(change)
+                yield 'event: reset\ndata: {}\n\n'
+            finally:
+                self.unsubscribe(subscription)
+
+        return generate()
+
+
+def format_event(change):
+    return f"id: {change['version']}\nevent: change\ndata: {json.dumps(change, separators=(',', ':'))}\n\n"
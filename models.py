@@ -1,9 +1,35 @@
+from collections import namedtuple
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timezone
+from sqlalchemy import case, event, func, inspect, literal, select, text
+from sqlalchemy.schema import CreateIndex
+from datetime import datetime, timedelta, timezone
+from search import ensure_search_index
+from sync import ensure_change_tracking
 
 db = SQLAlchemy()
 
-class Task(db.Model):
+# Priority display lookups (0=none, 1=low, 2=medium, 3=high)
+PRIORITY_TEXT = {0: "", 1: "low", 2: "medium", 3: "high"}
+PRIORITY_COLORS = {0: "", 1: "#28a745", 2: "#ffc107", 3: "#dc3545"}
+
+def completed_at_default(context):
+    """Stamp rows inserted as already completed with the current time"""
+    if context.get_current_parameters().get('completed'):
+        return datetime.now(timezone.utc)
+    return None
+
+class PriorityMixin:
+    __slots__ = ()
+    
+    @property
+    def priority_text(self):
+        return PRIORITY_TEXT.get(self.priority, "")
+    
+    @property 
+    def priority_color(self):
+        return PRIORITY_COLORS.get(self.priority, "")
+
+class Task(PriorityMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     completed = db.Column(db.Boolean, default=False)
@@ -12,25 +38,56 @@ class Task(db.Model):
     due_date = db.Column(db.Date, nullable=True)
     priority = db.Column(db.Integer, default=0)  # 0=none, 1=low, 2=medium, 3=high
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True, default=completed_at_default)
+    version = db.Column(db.Integer, nullable=True)  # change version, maintained by sync.py triggers
+    
+    archived = False
     
     def __repr__(self):
         return f'<Task {self.name}>'
+
+# Indexes matching the active-task sort order (undated tasks last, then by due date and priority)
+# and the completed listing; the trailing id keeps keyset pagination on the index
+db.Index('ix_task_open_due', Task.completed, (Task.due_date == None), Task.due_date, Task.priority.desc(), Task.id)
+db.Index('ix_task_project_open_due', Task.project_id, Task.completed, (Task.due_date == None), Task.due_date, Task.priority.desc(), Task.id)
+db.Index('ix_task_completed_at', Task.completed, Task.completed_at, Task.id)
+db.Index('ix_task_version', Task.version)
+
+# The day a task needs attention: the earlier of its do and due dates, NULL when it has neither.
+# Indexed for open tasks, so each agenda bucket is a range scan over it; the trailing dates
+# let the scan skip overdue tasks, and count buckets, without reading the table
+agenda_date = case((Task.due_date < Task.do_date, Task.due_date), else_=func.coalesce(Task.do_date, Task.due_date))
+db.Index('ix_task_open_agenda', Task.completed, agenda_date, Task.priority.desc(), Task.id, Task.due_date, Task.do_date)
+
+class ArchivedTask(PriorityMixin, db.Model):
+    """A completed task moved out of the live task table by archive_completed_tasks()"""
+    __tablename__ = 'task_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)  # id the task had in the live table
+    name = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime)
+    do_date = db.Column(db.Date, nullable=True)
+    due_date = db.Column(db.Date, nullable=True)
+    priority = db.Column(db.Integer, default=0)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
     
-    @property
-    def priority_text(self):
-        priority_map = {0: "", 1: "low", 2: "medium", 3: "high"}
-        return priority_map.get(self.priority, "")
+    completed = True  # so archived rows render like completed tasks
+    archived = True
     
-    @property 
-    def priority_color(self):
-        color_map = {0: "", 1: "#28a745", 2: "#ffc107", 3: "#dc3545"}
-        return color_map.get(self.priority, "")
+    def __repr__(self):
+        return f'<ArchivedTask {self.name}>'
+
+db.Index('ix_task_archive_completed_at', ArchivedTask.completed_at, ArchivedTask.id)
+db.Index('ix_task_archive_project', ArchivedTask.project_id)
 
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     color = db.Column(db.String(7), default="#00cc33")  # Hex color code
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=True)  # change version, maintained by sync.py triggers
     
     # Relationship to tasks
     tasks = db.relationship('Task', backref='project', lazy=True)
@@ -38,6 +95,25 @@ class Project(db.Model):
     def __repr__(self):
         return f'<Project {self.name}>'
 
+db.Index('ix_project_version', Project.version)
+
+TASK_ROW_FIELDS = ('id', 'name', 'do_date', 'due_date', 'priority', 'completed_at',
+                   'project_name', 'project_color', 'completed', 'archived')
+
+class TaskRow(PriorityMixin, namedtuple('TaskRow', TASK_ROW_FIELDS)):
+    """Read-only task for list views: plain column values with the project's name and color"""
+    __slots__ = ()
+
+def task_row_query(model=Task):
+    """Select just the TaskRow columns of model, joining in the project, without ORM entities"""
+    return db.session.query(model.id, model.name, model.do_date, model.due_date, model.priority,
+                            model.completed_at, Project.name, Project.color)\
+                     .outerjoin(Project, model.project_id == Project.id)
+
+def task_rows(rows, completed, archived=False):
+    """Turn rows fetched with task_row_query() into TaskRow records"""
+    return [TaskRow(*row, completed, archived) for row in rows]
+
 class Timer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
@@ -46,6 +122,176 @@ class Timer(db.Model):
     planned_minutes = db.Column(db.Integer, nullable=False)  # 10, 25, or 30
     notes = db.Column(db.Text, nullable=True)
     date = db.Column(db.Date, nullable=False, default=lambda: datetime.now(timezone.utc).date())
+    version = db.Column(db.Integer, nullable=True)  # change version, maintained by sync.py triggers
     
     def __repr__(self):
-        return f'<Timer {self.duration_minutes}min on {self.date}>'
\ No newline at end of file
+        return f'<Timer {self.duration_minutes}min on {self.date}>'
+
+db.Index('ix_timer_start', Timer.start_time, Timer.id)
+db.Index('ix_timer_version', Timer.version)
+
+ROLLUP_PERIODS = ('day', 'week', 'month')
+
+class TimerRollup(db.Model):
+    """Completed focus sessions summed per day, week (from Monday) and month"""
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(5), nullable=False)  # 'day', 'week' or 'month'
+    period_start = db.Column(db.Date, nullable=False)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    planned_minutes = db.Column(db.Integer, nullable=False, default=0)
+    actual_minutes = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('period', 'period_start', name='uq_timer_rollup_period'),)
+    
+    def __repr__(self):
+        return f'<TimerRollup {self.period} {self.period_start}: {self.sessions} sessions>'
+
+def period_start(period, day):
+    """First day of the day/week/month period containing day"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+def update_timer_rollups(day, sessions, planned_minutes, actual_minutes):
+    """Add the given amounts to every rollup containing day, in the current transaction"""
+    # Dialect modules are imported here so startup only loads the one in use
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    for period in ROLLUP_PERIODS:
+        stmt = insert(TimerRollup).values(
+            period=period,
+            period_start=period_start(period, day),
+            sessions=sessions,
+            planned_minutes=planned_minutes,
+            actual_minutes=actual_minutes,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['period', 'period_start'],
+            set_={
+                'sessions': TimerRollup.sessions + stmt.excluded.sessions,
+                'planned_minutes': TimerRollup.planned_minutes + stmt.excluded.planned_minutes,
+                'actual_minutes': TimerRollup.actual_minutes + stmt.excluded.actual_minutes,
+            },
+        )
+        db.session.execute(stmt)
+
+def rebuild_timer_rollups():
+    """Recompute every rollup from the completed sessions in Timer"""
+    daily = db.session.query(
+        Timer.date,
+        func.count(Timer.id),
+        func.sum(Timer.planned_minutes),
+        func.coalesce(func.sum(Timer.duration_minutes), 0),
+    ).filter(Timer.end_time != None).group_by(Timer.date).all()
+    
+    # Fold the per-day totals into weeks and months
+    totals = {}
+    for day, sessions, planned, actual in daily:
+        for period in ROLLUP_PERIODS:
+            key = (period, period_start(period, day))
+            current = totals.get(key, (0, 0, 0))
+            totals[key] = (current[0] + sessions, current[1] + planned, current[2] + actual)
+    
+    db.session.query(TimerRollup).delete()
+    if totals:
+        db.session.execute(TimerRollup.__table__.insert(), [
+            {'period': period, 'period_start': start, 'sessions': sessions,
+             'planned_minutes': planned, 'actual_minutes': actual}
+            for (period, start), (sessions, planned, actual) in totals.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+def ensure_columns(engine):
+    """Add nullable columns declared since an existing table was created.
+    
+    Returns the (table, column) pairs that were added.
+    """
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    added.append((table.name, column.name))
+        
+        # Tasks completed before completed_at existed: creation time is the best we know
+        if ('task', 'completed_at') in added:
+            conn.execute(Task.__table__.update()
+                             .where(Task.completed == True)
+                             .values(completed_at=Task.created_at))
+    return added
+
+def ensure_indexes(engine):
+    """Create indexes that are missing from tables built before they were declared"""
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+def init_schema(engine):
+    """Bring the database up to date: tables, added columns, indexes and triggers.
+    
+    Safe to run repeatedly. Works on a bare engine, so it needs no Flask app.
+    """
+    db.metadata.create_all(engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    ensure_search_index(engine)
+    ensure_change_tracking(engine)
+
+ARCHIVE_COLUMNS = ['task_id', 'name', 'created_at', 'do_date', 'due_date', 'priority', 'project_id', 'completed_at']
+
+def archive_completed_tasks(older_than_days, batch_size=500):
+    """Move tasks completed more than older_than_days ago into task_archive.
+    
+    Works in batches, each its own short transaction, so writers are never
+    held up for long. Returns the number of tasks moved.
+    """
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        ids = [row[0] for row in db.session.query(Task.id)
+                                           .filter(Task.completed == True, Task.completed_at < cutoff)
+                                           .limit(batch_size)]
+        if not ids:
+            break
+        
+        db.session.execute(ArchivedTask.__table__.insert().from_select(
+            ARCHIVE_COLUMNS + ['archived_at'],
+            select(Task.id, Task.name, Task.created_at, Task.do_date, Task.due_date, Task.priority,
+                   Task.project_id, Task.completed_at, literal(now, db.DateTime))
+                .where(Task.id.in_(ids))
+        ))
+        db.session.query(Task).filter(Task.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(ids)
+    return moved
+
+def shift_date(column, days):
+    """SQL expression moving a date column by a whole number of days (NULL stays NULL)"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.date(column, f'{days:+d} days')
+    return column + days
+
+def enable_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMAs on every new connection if engine is SQLite"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
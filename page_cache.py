@@ -0,0 +1,209 @@
+"""
+Rendered-page cache with write-driven invalidation.
+
+Pages are cached by endpoint and full path under a data generation counter.
+Any commit that wrote to the database bumps the generation, which retires
+every cached page at once. The shared backend's generation is seen by
+every process on the host, including the CLI commands and the importer.
+A local cache only sees its own process's writes; several processes each
+with a local cache can set PAGE_CACHE_CHECK_VERSION to also key pages by
+the database's change version (sync.py), at the cost of one single-row
+read per cached request. Keys also carry today's date, so pages showing overdue counts or next due dates turn
+over at midnight without any write. Responses carry a strong ETag so
+browsers can revalidate with If-None-Match and get a 304.
+
+Two backends are provided: LocalCacheBackend (a bounded in-process LRU, for
+a single worker) and SQLiteCacheBackend (a small cache file shared by every
+worker on the host). Anything with the same four methods can be plugged in.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from flask import Response, current_app, has_app_context, request
+from sqlalchemy import event
+from sync import current_version, sync_available
+
+
+class LocalCacheBackend:
+    """Bounded LRU cache held in this process"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the entry stored for key at the current generation, or None"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] != self._generation:
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, generation, entry):
+        with self._lock:
+            if generation != self._generation:
+                return  # rendered from data that has since changed
+            self._entries[key] = (generation, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self):
+        return self._generation
+
+    def bump(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """Cache shared between worker processes through a separate SQLite file"""
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_meta (id INTEGER PRIMARY KEY CHECK (id = 1), generation INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO cache_meta (id, generation) VALUES (1, 0)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, generation INTEGER NOT NULL, '
+                         'body BLOB NOT NULL, etag TEXT NOT NULL, mimetype TEXT NOT NULL, stored_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the entry stored for key at the current generation, or None"""
+        row = self._connect().execute(
+            'SELECT e.body, e.etag, e.mimetype FROM cache_entry e '
+            'JOIN cache_meta m ON m.id = 1 AND e.generation = m.generation WHERE e.key = ?', (key,)).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, key, generation, entry):
+        body, etag, mimetype = entry
+        with self._connect() as conn:
+            # Only store if the data hasn't changed since the page was rendered
+            conn.execute('INSERT OR REPLACE INTO cache_entry (key, generation, body, etag, mimetype, stored_at) '
+                         'SELECT ?, ?, ?, ?, ?, ? FROM cache_meta WHERE id = 1 AND generation = ?',
+                         (key, generation, body, etag, mimetype, time.time(), generation))
+            conn.execute('DELETE FROM cache_entry WHERE key NOT IN '
+                         '(SELECT key FROM cache_entry ORDER BY stored_at DESC LIMIT ?)', (self.max_entries,))
+
+    def generation(self):
+        return self._connect().execute('SELECT generation FROM cache_meta WHERE id = 1').fetchone()[0]
+
+    def bump(self):
+        with self._connect() as conn:
+            conn.execute('UPDATE cache_meta SET generation = generation + 1 WHERE id = 1')
+            conn.execute('DELETE FROM cache_entry')
+
+
+class PageCache:
+    """Caches whole rendered GET responses until the next write to the database.
+
+    One PageCache can serve several apps: each app's backend is kept in
+    app.extensions['page_cache'] and looked up through current_app.
+    """
+
+    def __init__(self, app=None, db=None):
+        self._watching = False
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        kind = app.config.get('PAGE_CACHE_BACKEND', 'local')
+        if kind == 'local':
+            backend = LocalCacheBackend(app.config.get('PAGE_CACHE_SIZE', 256))
+        elif kind == 'shared':
+            backend = SQLiteCacheBackend(app.config['PAGE_CACHE_PATH'], app.config.get('PAGE_CACHE_SIZE', 1024))
+        elif kind in (None, '', 'none'):
+            backend = None
+        else:
+            backend = kind  # a backend instance supplied directly
+        app.extensions['page_cache'] = backend
+        if not self._watching:
+            self._watch_writes(db.session)
+            self._watching = True
+
+    @property
+    def backend(self):
+        """The current app's backend, or None when caching is off"""
+        return current_app.extensions.get('page_cache')
+
+    def _watch_writes(self, session):
+        """Bump the generation after any commit that wrote through the session"""
+
+        def mark(session):
+            session.info['page_cache_dirty'] = True
+
+        @event.listens_for(session, 'after_flush')
+        def after_flush(session, flush_context):
+            mark(session)
+
+        @event.listens_for(session, 'do_orm_execute')
+        def do_orm_execute(orm_execute_state):
+            if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+                mark(orm_execute_state.session)
+
+        @event.listens_for(session, 'after_commit')
+        def after_commit(session):
+            if session.info.pop('page_cache_dirty', False) and has_app_context():
+                self.invalidate()
+
+        @event.listens_for(session, 'after_rollback')
+        def after_rollback(session):
+            session.info.pop('page_cache_dirty', None)
+
+    def invalidate(self):
+        """Retire every page cached for the current app"""
+        backend = self.backend
+        if backend is not None:
+            backend.bump()
+
+    def cached(self, view):
+        """Serve the view from the cache while the data generation is unchanged"""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = self.backend
+            if backend is None or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = f'{request.endpoint}:{date.today().isoformat()}:{request.full_path}'
+            if current_app.config.get('PAGE_CACHE_CHECK_VERSION') and sync_available(self.db.engine):
+                key = f'{current_version(self.db.session)}:{key}'
+            entry = backend.get(key)
+            if entry is None:
+                generation = backend.generation()
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response):
+                    response = Response(response)
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = (body, hashlib.sha1(body).hexdigest(), response.mimetype)
+                backend.set(key, generation, entry)
+
+            body, etag, mimetype = entry
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.cache_control.no_cache = True  # always revalidate, the ETag makes that cheap
+            return response.make_conditional(request)
+
+        return wrapper
@@ -0,0 +1,94 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page is addressed by the sort key of the row it starts after (or ends
+before) instead of an OFFSET, so every page is an index seek no matter how
+deep into the listing it is.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+
+
+class Page:
+    """One page of a keyset-paginated listing"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __repr__(self):
+        return f'<Page {len(self.items)} items>'
+
+
+def encode_cursor(values):
+    """Encode a row's sort key as an opaque URL-safe token"""
+    values = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, types, nullable=()):
+    """Decode a cursor token, converting each value with the matching entry of types.
+
+    Only the positions listed in nullable may hold null. Returns None if the
+    token is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            return None
+        if any(v is None and i not in nullable for i, v in enumerate(values)):
+            return None
+        return [None if v is None else convert(v) for convert, v in zip(types, values)]
+    except (ValueError, TypeError):
+        return None
+
+
+def _after(keys, cursor, backward):
+    """WHERE clause matching rows that come strictly after cursor in the keys ordering"""
+    terms = []
+    for i, ((column, descending), value) in enumerate(zip(keys, cursor)):
+        ascending = descending == backward
+        equal = [key == v for (key, _), v in zip(keys[:i], cursor[:i])]
+        terms.append(and_(*equal, column > value if ascending else column < value))
+
+    # Redundant bound on the leading key so the database can seek into the index
+    # and only filter the rows that tie with the cursor on that key
+    first, descending = keys[0]
+    bound = first >= cursor[0] if descending == backward else first <= cursor[0]
+    return and_(bound, or_(*terms))
+
+
+def keyset_page(query, keys, cursor=None, per_page=50, backward=False):
+    """Fetch up to per_page rows of query following (or, if backward, preceding) cursor.
+
+    keys is a list of (column, descending) pairs giving the listing order; the last
+    key must be unique. Returns (rows, has_more) with rows in display order.
+    """
+    if cursor is not None:
+        query = query.filter(_after(keys, cursor, backward))
+    order = [column.desc() if descending != backward else column.asc() for column, descending in keys]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backward:
+        rows.reverse()
+    return rows, has_more
+
+
+def build_page(rows, key, cursor, has_more, backward):
+    """Wrap fetched rows in a Page with next/prev cursors built by key(row)"""
+    if backward:
+        has_next, has_prev = cursor is not None, has_more
+    else:
+        has_next, has_prev = has_more, cursor is not None
+
+    next_cursor = encode_cursor(key(rows[-1])) if rows and has_next else None
+    prev_cursor = encode_cursor(key(rows[0])) if rows and has_prev else None
+    return Page(rows, next_cursor=next_cursor, prev_cursor=prev_cursor)
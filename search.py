@@ -0,0 +1,112 @@
+"""
+Full-text task search backed by SQLite FTS5 indexes over task names.
+
+task_fts and task_archive_fts are external-content FTS5 tables: they store
+only the index and read names back from the task and task_archive tables.
+Triggers keep them in sync on insert, update and delete, so every write path
+(routes, importer, archiving, raw SQL) is covered.
+
+Indexing row by row costs bulk loads about two thirds of their speed (the
+prefix indexes triple the terms written), so bulk_insert_tasks() switches
+the insert trigger off inside its own transaction and indexes each batch
+with a single INSERT ... SELECT instead.
+"""
+
+from sqlalchemy import column, table, text
+
+task_fts = table('task_fts', column('rowid'), column('rank'), column('task_fts'))
+task_archive_fts = table('task_archive_fts', column('rowid'), column('rank'), column('task_archive_fts'))
+
+# Index table for each searchable table
+FTS_TABLES = {'task': task_fts, 'task_archive': task_archive_fts}
+
+SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(
+        name, content='task', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    # deferred is only ever 1 inside a bulk_insert_tasks() transaction
+    "CREATE TABLE IF NOT EXISTS search_state (id INTEGER PRIMARY KEY CHECK (id = 1), deferred INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO search_state (id, deferred) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task
+        WHEN (SELECT deferred FROM search_state WHERE id = 1) = 0 BEGIN
+        INSERT INTO task_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF name ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO task_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    # Archived tasks, written in batches by archive_completed_tasks()
+    """CREATE VIRTUAL TABLE IF NOT EXISTS task_archive_fts USING fts5(
+        name, content='task_archive', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS task_archive_fts_insert AFTER INSERT ON task_archive BEGIN
+        INSERT INTO task_archive_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_archive_fts_delete AFTER DELETE ON task_archive BEGIN
+        INSERT INTO task_archive_fts(task_archive_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_archive_fts_update AFTER UPDATE OF name ON task_archive BEGIN
+        INSERT INTO task_archive_fts(task_archive_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO task_archive_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+
+def search_available(engine):
+    return engine.dialect.name == 'sqlite'
+
+
+def ensure_search_index(engine):
+    """Create the FTS5 tables and their triggers, indexing existing tasks the first time"""
+    if not search_available(engine):
+        return
+    with engine.begin() as conn:
+        missing = [fts for fts in FTS_TABLES.values()
+                   if not conn.execute(text('SELECT 1 FROM sqlite_master WHERE name = :name'),
+                                       {'name': fts.name}).first()]
+        trigger = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'task_fts_insert'")).scalar()
+        if trigger and 'search_state' not in trigger:
+            conn.execute(text('DROP TRIGGER task_fts_insert'))  # from before bulk loads could defer it
+        for statement in SEARCH_DDL:
+            conn.execute(text(statement))
+        for fts in missing:
+            conn.execute(text(f"INSERT INTO {fts.name}({fts.name}) VALUES ('rebuild')"))
+
+
+def bulk_insert_tasks(session, task_table, rows):
+    """Insert rows into task_table and index them with one statement, in the caller's transaction.
+    
+    Rows must not carry ids: the new ones are found as those above the
+    current highest id. The trigger is only off until this returns, and no
+    other connection can see that before the commit.
+    """
+    if not search_available(session.get_bind()):
+        session.execute(task_table.insert(), rows)
+        return
+    last_id = session.execute(text('SELECT coalesce(max(id), 0) FROM task')).scalar()
+    session.execute(text('UPDATE search_state SET deferred = 1 WHERE id = 1'))
+    session.execute(task_table.insert(), rows)
+    session.execute(text('INSERT INTO task_fts(rowid, name) SELECT id, name FROM task WHERE id > :last_id'),
+                    {'last_id': last_id})
+    session.execute(text('UPDATE search_state SET deferred = 0 WHERE id = 1'))
+
+
+def fts_query(terms):
+    """Turn free text into an FTS5 query matching every word as a prefix.
+
+    Each word is quoted so FTS5 operators and punctuation in user input are
+    treated as plain text.
+    """
+    words = terms.split()
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in words)
+
+
+def match_tasks(query, task_model, terms):
+    """Restrict a Task or ArchivedTask query to FTS matches; returns (query, rank column)"""
+    fts = FTS_TABLES[task_model.__tablename__]
+    query = query.join(fts, fts.c.rowid == task_model.id)\
+                 .filter(fts.c[fts.name].op('MATCH')(fts_query(terms)))
+    return query, fts.c.rank
@@ -0,0 +1,104 @@
+"""
+Change tracking for clients that mirror tasks, projects and timers.
+
+Every insert or update of a tracked row stamps it with the next value of a
+single database-wide change counter, and every delete leaves a tombstone
+holding a version of its own. A client keeps the highest version it has seen
+and asks only for what came after it, which is a range scan on the version
+indexes however large the database is.
+
+As with the search index, the bookkeeping is done by SQLite triggers so that
+every write path (routes, batch updates, the importer, archiving) is covered.
+Tasks moved to the archive table are reported as deleted.
+"""
+
+from datetime import date, datetime
+from sqlalchemy import column, select, table, text
+
+TRACKED_TABLES = ('project', 'task', 'timer')
+
+sync_tombstone = table('sync_tombstone', column('version'), column('entity'), column('entity_id'))
+
+SYNC_DDL = [
+    "CREATE TABLE IF NOT EXISTS sync_state (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO sync_state (id, version) VALUES (1, 0)",
+    """CREATE TABLE IF NOT EXISTS sync_tombstone (
+        version INTEGER PRIMARY KEY, entity TEXT NOT NULL, entity_id INTEGER NOT NULL)""",
+]
+for name in TRACKED_TABLES:
+    SYNC_DDL += [
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_sync_insert AFTER INSERT ON {name} BEGIN
+            UPDATE sync_state SET version = version + 1 WHERE id = 1;
+            UPDATE {name} SET version = (SELECT version FROM sync_state WHERE id = 1) WHERE id = new.id;
+        END""",
+        # The WHEN clause skips the trigger's own version stamp
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_sync_update AFTER UPDATE ON {name}
+            WHEN new.version IS old.version BEGIN
+            UPDATE sync_state SET version = version + 1 WHERE id = 1;
+            UPDATE {name} SET version = (SELECT version FROM sync_state WHERE id = 1) WHERE id = new.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_sync_delete AFTER DELETE ON {name} BEGIN
+            UPDATE sync_state SET version = version + 1 WHERE id = 1;
+            INSERT INTO sync_tombstone (version, entity, entity_id)
+                SELECT version, '{name}', old.id FROM sync_state WHERE id = 1;
+        END""",
+    ]
+
+
+def sync_available(engine):
+    return engine.dialect.name == 'sqlite'
+
+
+def ensure_change_tracking(engine):
+    """Create the change counter, tombstones and triggers, versioning existing rows the first time"""
+    if not sync_available(engine):
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sync_state'")).first()
+        for statement in SYNC_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            # Number the rows already there so a first sync from 0 returns all of them
+            version = 0
+            for name in TRACKED_TABLES:
+                conn.execute(text(f'UPDATE {name} SET version = :offset + id'), {'offset': version})
+                version += conn.execute(text(f'SELECT coalesce(max(id), 0) FROM {name}')).scalar()
+            conn.execute(text('UPDATE sync_state SET version = :version WHERE id = 1'), {'version': version})
+
+
+def current_version(session):
+    return session.execute(text('SELECT version FROM sync_state WHERE id = 1')).scalar()
+
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def changes_since(session, metadata, since, limit):
+    """Up to limit changes with a version above since, oldest first.
+
+    Returns (changes, has_more). Each change is a dict with the entity type,
+    id and version, plus either the row's columns under 'data' or
+    'deleted': True.
+    """
+    changes = []
+    for name in TRACKED_TABLES:
+        tracked = metadata.tables[name]
+        rows = session.execute(select(tracked)
+                                   .where(tracked.c.version > since)
+                                   .order_by(tracked.c.version)
+                                   .limit(limit + 1))
+        for row in rows.mappings():
+            data = {key: json_value(value) for key, value in row.items() if key != 'version'}
+            changes.append({'type': name, 'id': row['id'], 'version': row['version'], 'data': data})
+
+    tombstones = session.execute(select(sync_tombstone.c.version, sync_tombstone.c.entity, sync_tombstone.c.entity_id)
+                                     .where(sync_tombstone.c.version > since)
+                                     .order_by(sync_tombstone.c.version)
+                                     .limit(limit + 1))
+    for version, entity, entity_id in tombstones:
+        changes.append({'type': entity, 'id': entity_id, 'version': version, 'deleted': True})
+
+    # Each source is in version order; keep the lowest versions across all of them
+    changes.sort(key=lambda change: change['version'])
+    return changes[:limit], len(changes) > limit
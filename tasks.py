@@ -1,33 +1,387 @@
 import csv
+import gzip
+import heapq
+import hmac
+import io
+import os
+import zlib
+import click
+from functools import wraps
+from itertools import islice
 from io import StringIO
-from flask import Flask, render_template, request, redirect, url_for, make_response
-from models import db, Task, Timer, Project
-from datetime import datetime, timezone
+from flask import (Blueprint, Flask, Response, current_app, render_template, request, redirect, url_for, abort,
+                   stream_with_context, jsonify)
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.exc import IntegrityError
+from models import (db, Task, ArchivedTask, Timer, Project, TimerRollup, PRIORITY_TEXT, ROLLUP_PERIODS,
+                    TaskRow, task_row_query, task_rows, agenda_date, init_schema, enable_sqlite_pragmas, update_timer_rollups,
+                    rebuild_timer_rollups, shift_date, archive_completed_tasks)
+from pagination import keyset_page, build_page, decode_cursor
+from page_cache import PageCache
+from instrumentation import Instrumentation
+from live import LiveHub
+from search import search_available, match_tasks
+from sync import sync_available, changes_since, current_version, json_value
+from backup import sqlite_path, snapshot, restore, dump_jsonl, load_jsonl
+from config import load_config
+from datetime import date, datetime, timedelta, timezone
 
-app = Flask(__name__)
+bp = Blueprint('tasks', __name__, cli_group=None)
+page_cache = PageCache()
+instrumentation = Instrumentation()
+live = LiveHub()
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tasks.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def create_app(config=None):
+    """Build the web app; config entries override the defaults from config.py.
+    
+    The schema is not touched here: run `flask --app tasks init-db` once, and
+    again after upgrading.
+    """
+    app = Flask(__name__)
+    app.config.update(load_config(app.instance_path))
+    app.config.update(config or {})
+    
+    db.init_app(app)
+    with app.app_context():
+        enable_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+    
+    os.makedirs(app.instance_path, exist_ok=True)
+    page_cache.init_app(app, db)
+    instrumentation.init_app(app, db)
+    live.init_app(app, db)
+    app.register_blueprint(bp)
+    return app
+
+def __getattr__(name):
+    # `tasks:app` for WSGI servers and existing scripts, built on first use
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create missing tables, columns, indexes and triggers"""
+    init_schema(db.engine)
+    print("Database schema is up to date")
+
+def page_args(types, default_size=None, nullable=()):
+    """Read the cursor, direction and page size from the query string"""
+    per_page = request.args.get('per_page', default_size or current_app.config['PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+    
+    backward = 'before' in request.args
+    token = request.args.get('before' if backward else 'after')
+    if not token:
+        return None, False, per_page
+    
+    cursor = decode_cursor(token, types, nullable)
+    if cursor is None:
+        abort(400)
+    return cursor, backward, per_page
+
+@bp.app_template_global()
+def page_url(**cursor):
+    """URL of the current listing with its filters kept and the cursor replaced"""
+    args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+    return url_for(request.endpoint, **request.view_args, **args, **cursor)
+
+def open_task_key(task):
+    return [int(task.due_date is None), task.due_date, task.priority, task.id]
+
+def paginate_open_tasks(query):
+    """Page through open tasks by due date (undated last), then priority.
+    
+    query selects the task_row_query() columns; the page holds TaskRow records.
+    Dated and undated tasks are paged as two index segments so each query can
+    seek on its leading key; a page that spans the boundary takes two queries.
+    """
+    cursor, backward, per_page = page_args([int, date.fromisoformat, int, int], nullable=(1,))
+    # The segment flag picks the index segment; only undated cursors carry no date
+    if cursor is not None and (cursor[0] not in (0, 1) or (cursor[0] == 1) != (cursor[1] is None)):
+        abort(400)
+    segments = [
+        (query.filter((Task.due_date == None) == False),
+         [(Task.due_date, False), (Task.priority, True), (Task.id, False)]),
+        # The plain IS NULL test lets the index order the undated segment by priority
+        (query.filter((Task.due_date == None) == True, Task.due_date == None),
+         [(Task.priority, True), (Task.id, False)]),
+    ]
+    
+    if cursor is None:
+        start = 0
+        segment_cursor = None
+    else:
+        start = cursor[0]
+        segment_cursor = cursor[1:] if start == 0 else cursor[2:]
+    order = [1, 0] if backward else [0, 1]
+    
+    rows = []
+    has_more = False
+    for segment in order[order.index(start):]:
+        segment_query, keys = segments[segment]
+        fetched, has_more = keyset_page(segment_query, keys, segment_cursor,
+                                        per_page - len(rows), backward)
+        rows = fetched + rows if backward else rows + fetched
+        segment_cursor = None
+        if has_more:
+            break
+    
+    return build_page(task_rows(rows, completed=False), open_task_key, cursor, has_more, backward)
+
+# Id bounds used to include or exclude rows that tie with a cursor on completed_at
+MAX_ID = 2 ** 62
+
+def completed_key(task):
+    return [task.completed_at, int(task.archived), task.id]
+
+def source_cursor(cursor, archived):
+    """Translate a merged live/archive cursor into one for the live or archive table.
+    
+    The merged order is a sort key, then the archived flag, then id, all in the
+    same direction, so a cursor from the other table only needs its sort key.
+    """
+    if cursor is None:
+        return None
+    sort_key, cursor_archived, task_id = cursor
+    if archived == cursor_archived:
+        return [sort_key, task_id]
+    return [sort_key, MAX_ID if archived < cursor_archived else 0]
+
+def search_key(row):
+    """Merged cursor for a (sort key, archived, TaskRow) search result"""
+    return [row[0], row[1], row[2].id]
+
+def paginate_completed_tasks():
+    """Page through live and archived completed tasks, most recently completed first"""
+    cursor, backward, per_page = page_args([datetime.fromisoformat, int, int])
+    if cursor is not None and cursor[1] not in (0, 1):
+        abort(400)
+    sources = [(task_row_query(Task).filter(Task.completed == True), Task, 0),
+               (task_row_query(ArchivedTask), ArchivedTask, 1)]
+    
+    rows = []
+    has_more = False
+    for query, model, archived in sources:
+        keys = [(model.completed_at, True), (model.id, True)]
+        fetched, more = keyset_page(query, keys, source_cursor(cursor, archived), per_page, backward)
+        rows += task_rows(fetched, completed=True, archived=bool(archived))
+        has_more = has_more or more
+    
+    rows.sort(key=completed_key, reverse=True)
+    if len(rows) > per_page:
+        has_more = True
+        rows = rows[-per_page:] if backward else rows[:per_page]
+    return build_page(rows, completed_key, cursor, has_more, backward)
 
-# Initialize database
-db.init_app(app)
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
-@app.route('/')
+def iter_chunks(stmt):
+    """Execute a Core select and yield its rows as plain tuples, a chunk at a time"""
+    result = db.session.execute(stmt.execution_options(yield_per=current_app.config['EXPORT_CHUNK_SIZE']))
+    yield from result.partitions()
+
+def stream_download(filename, mimetype, parts):
+    """Stream text parts as a file download, gzipped if the client accepts it"""
+    def compress(parts):
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        for part in parts:
+            data = compressor.compress(part.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if current_app.config['EXPORT_GZIP'] and 'gzip' in request.accept_encodings:
+        parts = compress(parts)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    
+    return Response(stream_with_context(parts), mimetype=mimetype, headers=headers)
+
+def stream_csv(filename, header, chunks):
+    """Stream a CSV download, writing each chunk of formatted rows as it arrives"""
+    def generate():
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        yield buffer.getvalue()
+        for rows in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    
+    return stream_download(filename, 'text/csv', generate())
+
+def format_date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+@bp.route('/')
+@page_cache.cached
 def home():
-    tasks = Task.query.filter_by(completed=False)\
-                     .order_by((Task.due_date == None), Task.due_date, Task.priority.desc())\
-                     .all()
+    # Plain column rows with the project name and color joined in, no ORM entities
+    page = paginate_open_tasks(task_row_query().filter(Task.completed == False))
     projects = Project.query.all()  # For the dropdown
     return render_template('index.html', 
                          title="My Task Manager", 
-                         tasks=tasks,
+                         tasks=page.items,
+                         page=page,
                          projects=projects)
 
-@app.route('/add', methods=['POST'])
-def add_task():
-    from datetime import datetime
+# Agenda buckets in display order: (name, heading)
+AGENDA_BUCKETS = (('overdue', 'Overdue'), ('start_now', 'Start Now'), ('today', 'Today'),
+                  ('next_7_days', 'Next 7 Days'), ('later', 'Later'), ('undated', 'No Date'))
+
+def agenda_buckets(today, limit):
+    """Open tasks grouped by when they need attention, the first limit of each bucket.
     
+    A task is overdue once its due date has passed and due today on its due
+    date. Any other task is filed under its agenda date, the earlier of its do
+    and due dates, and one whose do date has passed is to be started now.
+    Every bucket is a range on ix_task_open_due or ix_task_open_agenda (today
+    is one on each): one query reads its first tasks and, only when there are
+    more, a second counts them.
+    """
+    week_end = today + timedelta(days=7)
+    by_priority = [Task.priority.desc(), Task.id]
+    by_agenda = [agenda_date, *by_priority]
+    # (condition, order); a bucket holding a single agenda date (or none) is ordered
+    # by priority alone, which is how the index holds it
+    ranges = {
+        # The IS NULL term matches ix_task_open_due's second column, so this seeks on due_date
+        'overdue': (((Task.due_date == None) == False) & (Task.due_date < today), [Task.due_date, *by_priority]),
+        'start_now': ((agenda_date < today) & ((Task.due_date == None) | (Task.due_date > today)), by_agenda),
+        'today': ((agenda_date == today) | (Task.due_date == today), by_priority),
+        'next_7_days': ((agenda_date > today) & (agenda_date <= week_end), by_agenda),
+        'later': (agenda_date > week_end, by_agenda),
+        'undated': (agenda_date == None, by_priority),
+    }
+    buckets = []
+    for name, label in AGENDA_BUCKETS:
+        condition, order = ranges[name]
+        in_bucket = (Task.completed == False) & condition
+        rows = task_row_query().filter(in_bucket).order_by(*order).limit(limit).all()
+        count = len(rows)
+        if count == limit:
+            count = db.session.query(func.count(Task.id)).filter(in_bucket).scalar()
+        buckets.append({'name': name, 'label': label, 'count': count, 'tasks': task_rows(rows, False)})
+    return buckets
+
+def agenda_args():
+    limit = request.args.get('limit', current_app.config['AGENDA_BUCKET_SIZE'], type=int)
+    return date.today(), max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+@bp.route('/agenda')
+@page_cache.cached
+def agenda():
+    today, limit = agenda_args()
+    projects = Project.query.all()  # For the batch "move to project" dropdown
+    return render_template('agenda.html', buckets=agenda_buckets(today, limit), today=today,
+                           projects=projects, title="Agenda")
+
+@bp.route('/api/agenda')
+def agenda_json():
+    today, limit = agenda_args()
+    fields = ('id', 'name', 'do_date', 'due_date', 'priority', 'project_name')
+    buckets = [{'name': bucket['name'], 'count': bucket['count'],
+                'tasks': [{field: json_value(getattr(task, field)) for field in fields} for task in bucket['tasks']]}
+               for bucket in agenda_buckets(today, limit)]
+    return jsonify({'today': today.isoformat(), 'limit': limit, 'buckets': buckets})
+
+@bp.route('/search')
+@page_cache.cached
+def search():
+    terms = request.args.get('q', '').strip()
+    project_id = request.args.get('project_id', type=int)
+    status = request.args.get('status', 'all')
+    due_from = request.args.get('due_from', type=date.fromisoformat)
+    due_to = request.args.get('due_to', type=date.fromisoformat)
+    
+    page = None
+    if terms:
+        live = task_row_query(Task).add_columns(Task.completed)
+        if status in ('open', 'completed'):
+            live = live.filter(Task.completed == (status == 'completed'))
+        sources = [(live, Task, 0)]
+        if status != 'open':
+            sources.append((task_row_query(ArchivedTask).add_columns(literal(True)), ArchivedTask, 1))
+        
+        fts = search_available(db.engine)
+        cursor, backward, per_page = page_args([float if fts else int, int, int])
+        if cursor is not None and cursor[1] not in (0, 1):
+            abort(400)
+        rows = []
+        has_more = False
+        for query, model, archived in sources:
+            if project_id:
+                query = query.filter(model.project_id == project_id)
+            if due_from:
+                query = query.filter(model.due_date >= due_from)
+            if due_to:
+                query = query.filter(model.due_date <= due_to)
+            if fts:
+                # Best FTS5 (bm25) matches first; each table is ranked by its own index
+                query, sort = match_tasks(query, model, terms)
+                keys = [(sort, False), (model.id, False)]
+            else:
+                # No FTS5 outside SQLite; fall back to a substring match, newest first,
+                # with id doubling as the sort key so cursors keep one shape
+                query, sort = query.filter(model.name.ilike(f'%{terms}%')), model.id
+                keys = [(sort, True), (model.id, True)]
+            fetched, more = keyset_page(query.add_columns(sort), keys, source_cursor(cursor, archived),
+                                        per_page, backward)
+            rows += [(value, archived, TaskRow(*columns, bool(completed), bool(archived)))
+                     for *columns, completed, value in fetched]
+            has_more = has_more or more
+        
+        rows.sort(key=search_key, reverse=not fts)
+        if len(rows) > per_page:
+            has_more = True
+            rows = rows[-per_page:] if backward else rows[:per_page]
+        page = build_page(rows, search_key, cursor, has_more, backward)
+        page.items = [task for _, _, task in page.items]
+    
+    return render_template('search.html',
+                         title="Search Tasks",
+                         terms=terms,
+                         page=page,
+                         tasks=page.items if page else [],
+                         projects=Project.query.all())
+
+def wants_fragment():
+    """True when the page script asked for the changed row instead of a redirect"""
+    return request.headers.get('X-Fragment') == '1'
+
+def task_fragment(task_id, status=200, hide_project=False):
+    """Just the task's row from _task_row.html, read back with a single query"""
+    row = task_row_query().add_columns(Task.completed).filter(Task.id == task_id).first()
+    if row is None:
+        abort(404)
+    *columns, completed = row
+    task = TaskRow(*columns, completed, False)
+    return render_template('_task_row.html', task=task, hide_project=hide_project), status
+
+@bp.route('/tasks/rows')
+def changed_task_rows():
+    """Rows from _task_row.html for up to MAX_PAGE_SIZE comma-separated ids, in one query.
+    
+    Used by the live-update script to redraw the tasks in a batch of changes;
+    ids that no longer exist are left out.
+    """
+    ids = [int(task_id) for task_id in request.args.get('ids', '').split(',') if task_id.isdigit()]
+    ids = ids[:current_app.config['MAX_PAGE_SIZE']]
+    hide_project = request.args.get('hide_project') == '1'
+    rows = task_row_query().add_columns(Task.completed).filter(Task.id.in_(ids)).order_by(Task.id).all()
+    return ''.join(render_template('_task_row.html', task=TaskRow(*columns, completed, False), hide_project=hide_project)
+                   for *columns, completed in rows)
+
+@bp.route('/add', methods=['POST'])
+def add_task():
     task_name = request.form['task']
     do_date = request.form['do_date'] if request.form['do_date'] else None
     due_date = request.form['due_date'] if request.form['due_date'] else None
@@ -43,102 +397,166 @@ def add_task():
     new_task = Task(name=task_name, do_date=do_date, due_date=due_date, priority=priority, project_id=project_id)
     db.session.add(new_task)
     db.session.commit()
-    return redirect(url_for('home'))
+    if wants_fragment():
+        return task_fragment(new_task.id, 201)
+    return redirect(url_for('.home'))
 
-@app.route('/complete/<int:task_id>')
+@bp.route('/complete/<int:task_id>')
 def complete_task(task_id):
     task = Task.query.get_or_404(task_id)
-    task.completed = True
+    if not task.completed:
+        task.completed = True
+        task.completed_at = datetime.now(timezone.utc)
     db.session.commit()
-    return redirect(url_for('home'))
+    if wants_fragment():
+        return '', 204  # the row leaves the active list
+    return redirect(url_for('.home'))
 
-@app.route('/delete/<int:task_id>')
+@bp.route('/delete/<int:task_id>')
 def delete_task(task_id):
     task = Task.query.get_or_404(task_id)
     db.session.delete(task)
     db.session.commit()
-    return redirect(url_for('home'))
+    if wants_fragment():
+        return '', 204
+    return redirect(url_for('.home'))
 
-@app.route('/completed')
+BATCH_OPERATIONS = ('complete', 'delete', 'move', 'priority', 'shift')
+
+@bp.route('/tasks/batch', methods=['POST'])
+def batch_tasks():
+    """Apply one operation to many tasks with a single UPDATE or DELETE.
+    
+    Accepts a form (redirecting back to the page it came from) or a JSON body
+    like {"task_ids": [1, 2], "operation": "priority", "priority": 3}.
+    """
+    data = request.get_json() if request.is_json else request.form
+    try:
+        if request.is_json:
+            if not isinstance(data, dict):
+                abort(400)
+            task_ids = data.get('task_ids', [])
+            if not isinstance(task_ids, list) or \
+                    not all(isinstance(task_id, int) and not isinstance(task_id, bool) for task_id in task_ids):
+                abort(400)
+        else:
+            task_ids = [int(task_id) for task_id in data.getlist('task_ids')]
+        operation = data.get('operation')
+        if operation not in BATCH_OPERATIONS:
+            abort(400)
+        
+        values = None
+        if operation == 'complete':
+            values = {Task.completed: True, Task.completed_at: datetime.now(timezone.utc)}
+        elif operation == 'move':
+            values = {Task.project_id: int(data['project_id']) if data.get('project_id') else None}
+        elif operation == 'priority':
+            values = {Task.priority: int(data.get('priority') or 0)}
+        elif operation == 'shift':
+            days = int(data.get('days') or 0)
+            values = {Task.do_date: shift_date(Task.do_date, days),
+                      Task.due_date: shift_date(Task.due_date, days)}
+    except (KeyError, TypeError, ValueError):
+        abort(400)
+    
+    count = 0
+    if task_ids:
+        selected = Task.query.filter(Task.id.in_(task_ids))
+        if operation == 'complete':
+            selected = selected.filter(Task.completed == False)  # keep original completion times
+        if operation == 'delete':
+            count = selected.delete(synchronize_session=False)
+        else:
+            count = selected.update(values, synchronize_session=False)
+        db.session.commit()
+    
+    if request.is_json:
+        return jsonify({'operation': operation, 'count': count})
+    
+    # Only follow local paths back to the listing the form was on
+    next_url = request.form.get('next', '')
+    if not next_url.startswith('/') or next_url.startswith('//'):
+        next_url = url_for('.home')
+    return redirect(next_url)
+
+@bp.route('/completed')
+@page_cache.cached
 def completed_tasks():
-    # Show completed tasks, most recent first
-    tasks = Task.query.filter_by(completed=True)\
-                     .order_by(Task.created_at.desc())\
-                     .all()
+    # Show completed tasks from the live and archive tables, most recently completed first
+    page = paginate_completed_tasks()
     return render_template('completed.html', 
                          title="Completed Tasks", 
-                         tasks=tasks)
+                         tasks=page.items,
+                         page=page)
+
+@bp.route('/completed/archive', methods=['POST'])
+def archive_completed():
+    days = request.form.get('days', current_app.config['ARCHIVE_AFTER_DAYS'], type=int)
+    archive_completed_tasks(days, current_app.config['ARCHIVE_BATCH_SIZE'])
+    return redirect(url_for('.completed_tasks'))
 
-@app.route('/export/active')
+@bp.cli.command('archive-completed')
+@click.option('--days', type=int, default=None, help='Archive tasks completed more than this many days ago.')
+def archive_completed_command(days):
+    """Move old completed tasks into the archive table"""
+    if days is None:
+        days = current_app.config['ARCHIVE_AFTER_DAYS']
+    moved = archive_completed_tasks(days, current_app.config['ARCHIVE_BATCH_SIZE'])
+    print(f"Archived {moved} tasks completed more than {days} days ago")
+
+@bp.route('/export/active')
 def export_active_csv():
-    # Get all active tasks
-    tasks = Task.query.filter_by(completed=False)\
-                     .order_by((Task.due_date == None), Task.due_date, Task.priority.desc())\
-                     .all()
-    
-    # Create CSV content
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Name', 'Priority', 'Do Date', 'Due Date', 'Created At'])
-    
-    # Write task data
-    for task in tasks:
-        writer.writerow([
-            task.name,
-            task.priority_text,
-            task.do_date.strftime('%Y-%m-%d') if task.do_date else '',
-            task.due_date.strftime('%Y-%m-%d') if task.due_date else '',
-            task.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = 'attachment; filename=active_tasks.csv'
-    
-    return response
-
-@app.route('/export/completed')
+    # Stream active tasks straight from the cursor as plain column tuples
+    stmt = select(Task.name, Task.priority, Task.do_date, Task.due_date, Task.created_at)\
+             .where(Task.completed == False)\
+             .order_by((Task.due_date == None), Task.due_date, Task.priority.desc())
+    
+    chunks = ([[name,
+                PRIORITY_TEXT.get(priority, ""),
+                format_date(do_date),
+                format_date(due_date),
+                created_at.strftime('%Y-%m-%d %H:%M:%S')]
+               for name, priority, do_date, due_date, created_at in rows]
+              for rows in iter_chunks(stmt))
+    
+    return stream_csv('active_tasks.csv',
+                      ['Name', 'Priority', 'Do Date', 'Due Date', 'Created At'],
+                      chunks)
+
+@bp.route('/export/completed')
 def export_completed_csv():
-    # Get all completed tasks
-    tasks = Task.query.filter_by(completed=True)\
-                     .order_by(Task.created_at.desc())\
-                     .all()
-    
-    # Create CSV content
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Name', 'Priority', 'Do Date', 'Due Date', 'Created At', 'Completed'])
-    
-    # Write task data
-    for task in tasks:
-        writer.writerow([
-            task.name,
-            task.priority_text,
-            task.do_date.strftime('%Y-%m-%d') if task.do_date else '',
-            task.due_date.strftime('%Y-%m-%d') if task.due_date else '',
-            task.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'Yes'  # All these tasks are completed
-        ])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = 'attachment; filename=completed_tasks.csv'
-    
-    return response
-
-@app.route('/edit/<int:task_id>')
+    # Stream completed tasks from the live and archive tables as plain column tuples,
+    # merging the two ordered cursors by completion time
+    def completed_rows(model, *where):
+        stmt = select(model.name, model.priority, model.do_date, model.due_date, model.created_at,
+                      model.completed_at)\
+                 .where(*where)\
+                 .order_by(model.completed_at.desc())
+        for rows in iter_chunks(stmt):
+            yield from rows
+    
+    rows = heapq.merge(completed_rows(Task, Task.completed == True), completed_rows(ArchivedTask),
+                       key=lambda row: row[5], reverse=True)
+    chunks = ([[name,
+                PRIORITY_TEXT.get(priority, ""),
+                format_date(do_date),
+                format_date(due_date),
+                created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'Yes']  # All these tasks are completed
+               for name, priority, do_date, due_date, created_at, completed_at in chunk]
+              for chunk in chunked(rows, current_app.config['EXPORT_CHUNK_SIZE']))
+    
+    return stream_csv('completed_tasks.csv',
+                      ['Name', 'Priority', 'Do Date', 'Due Date', 'Created At', 'Completed'],
+                      chunks)
+
+@bp.route('/edit/<int:task_id>')
 def edit_task(task_id):
     task = Task.query.get_or_404(task_id)
     projects = Project.query.all()
     return render_template('edit_task.html', task=task, projects=projects, title="Edit Task")
 
-@app.route('/edit/<int:task_id>', methods=['POST'])
+@bp.route('/edit/<int:task_id>', methods=['POST'])
 def update_task(task_id):
     task = Task.query.get_or_404(task_id)
     
@@ -163,16 +581,16 @@ def update_task(task_id):
     task.project_id = int(request.form['project_id']) if request.form['project_id'] else None
     
     db.session.commit()
-    return redirect(url_for('home'))
+    if wants_fragment():
+        return task_fragment(task_id)
+    return redirect(url_for('.home'))
 
-@app.route('/timer')
+@bp.route('/timer')
 def timer():
     return render_template('timer.html', title="Focus Timer")
 
-@app.route('/timer/start', methods=['POST'])
+@bp.route('/timer/start', methods=['POST'])
 def start_timer():
-    from datetime import datetime
-    
     planned_minutes = int(request.form['duration'])
     
     # Create new timer session
@@ -184,16 +602,18 @@ def start_timer():
     db.session.add(timer)
     db.session.commit()
     
-    return redirect(url_for('timer_active', timer_id=timer.id))
+    return redirect(url_for('.timer_active', timer_id=timer.id))
 
-@app.route('/timer/<int:timer_id>')
+@bp.route('/timer/<int:timer_id>')
 def timer_active(timer_id):
     timer = Timer.query.get_or_404(timer_id)
     return render_template('timer_active.html', timer=timer, title="Timer Running")
 
-@app.route('/timer/<int:timer_id>/complete', methods=['POST'])
+@bp.route('/timer/<int:timer_id>/complete', methods=['POST'])
 def complete_timer(timer_id):
     timer = Timer.query.get_or_404(timer_id)
+    already_completed = timer.end_time is not None
+    previous_minutes = timer.duration_minutes or 0
     timer.end_time = datetime.now(timezone.utc)
     
     # Calculate actual duration in minutes - make sure both datetimes are timezone-aware
@@ -207,56 +627,148 @@ def complete_timer(timer_id):
     timer.duration_minutes = int(duration.total_seconds() / 60)
     
     timer.notes = request.form.get('notes', '')
+    
+    # Keep the focus-time rollups current in the same transaction
+    if already_completed:
+        update_timer_rollups(timer.date, 0, 0, timer.duration_minutes - previous_minutes)
+    else:
+        update_timer_rollups(timer.date, 1, timer.planned_minutes, timer.duration_minutes)
     db.session.commit()
     
-    return redirect(url_for('timer_log'))
+    return redirect(url_for('.timer_log'))
 
-@app.route('/timer/log')
+@bp.route('/timer/log')
+@page_cache.cached
 def timer_log():
-    # Show recent timer sessions
-    timers = Timer.query.filter(Timer.end_time != None)\
-                       .order_by(Timer.start_time.desc())\
-                       .limit(20).all()
-    return render_template('timer_log.html', timers=timers, title="Focus Sessions")
+    # Show timer sessions, most recent first
+    cursor, backward, per_page = page_args([datetime.fromisoformat, int], current_app.config['TIMER_LOG_PAGE_SIZE'])
+    keys = [(Timer.start_time, True), (Timer.id, True)]
+    timers, has_more = keyset_page(Timer.query.filter(Timer.end_time != None), keys, cursor, per_page, backward)
+    page = build_page(timers, lambda t: [t.start_time, t.id], cursor, has_more, backward)
+    return render_template('timer_log.html', timers=page.items, page=page, title="Focus Sessions")
+
+# Number of most recent periods shown on the stats page
+STATS_PERIODS = {'day': 14, 'week': 12, 'month': 12}
+
+def timer_stats():
+    """Recent focus-time rollups per period, read from TimerRollup only"""
+    stats = {}
+    for period in ROLLUP_PERIODS:
+        stats[period] = TimerRollup.query.filter_by(period=period)\
+                                         .order_by(TimerRollup.period_start.desc())\
+                                         .limit(STATS_PERIODS[period]).all()
+    return stats
+
+def rollup_dict(rollup):
+    return {
+        'period_start': rollup.period_start.isoformat(),
+        'sessions': rollup.sessions,
+        'planned_minutes': rollup.planned_minutes,
+        'actual_minutes': rollup.actual_minutes,
+    }
+
+@bp.route('/timer/stats')
+@page_cache.cached
+def timer_stats_page():
+    return render_template('timer_stats.html', stats=timer_stats(), title="Focus Stats")
+
+@bp.route('/api/timer/stats')
+def timer_stats_json():
+    return jsonify({period: [rollup_dict(r) for r in rollups] for period, rollups in timer_stats().items()})
 
-@app.route('/export/timers')
+@bp.route('/api/changes')
+def api_changes():
+    """Tasks, projects and timers changed or deleted since ?since=<version>, oldest first.
+    
+    Clients keep the returned version and pass it back on their next poll,
+    asking again straight away while has_more is true. reset is true when
+    since is ahead of the database (it was replaced by another one): the
+    client should drop its copy and sync again from 0.
+    """
+    if not sync_available(db.engine):
+        abort(501)
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        abort(400)
+    per_page = request.args.get('per_page', current_app.config['SYNC_PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+    
+    latest = current_version(db.session)
+    if since > latest:
+        return jsonify({'since': since, 'version': 0, 'has_more': True, 'changes': [], 'reset': True})
+    changes, has_more = changes_since(db.session, db.metadata, since, per_page)
+    version = changes[-1]['version'] if changes else max(since, latest)
+    return jsonify({'since': since, 'version': version, 'has_more': has_more, 'changes': changes, 'reset': False})
+
+@bp.route('/events')
+def events():
+    """Server-Sent Events stream of task, project and timer changes.
+    
+    Each event carries one change in the /api/changes format. A reconnecting
+    browser sends Last-Event-ID and first gets what it missed.
+    """
+    if not sync_available(db.engine):
+        abort(501)
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    stream = live.stream(since)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.cli.command('rebuild-timer-rollups')
+def rebuild_timer_rollups_command():
+    """Backfill the focus-time rollups from existing timer sessions"""
+    count = rebuild_timer_rollups()
+    print(f"Rebuilt {count} timer rollups")
+
+@bp.route('/export/timers')
 def export_timers_csv():
-    # Get all completed timer sessions
-    timers = Timer.query.filter(Timer.end_time != None)\
-                       .order_by(Timer.start_time.desc())\
-                       .all()
-    
-    # Create CSV content
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Date', 'Start Time', 'End Time', 'Planned Minutes', 'Actual Minutes', 'Notes'])
-    
-    # Write timer data
-    for timer in timers:
-        writer.writerow([
-            timer.date.strftime('%Y-%m-%d'),
-            timer.start_time.strftime('%H:%M:%S'),
-            timer.end_time.strftime('%H:%M:%S') if timer.end_time else '',
-            timer.planned_minutes,
-            timer.duration_minutes or '',
-            timer.notes or ''
-        ])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = 'attachment; filename=focus_sessions.csv'
-    
-    return response
-
-@app.route('/projects')
+    # Stream completed timer sessions straight from the cursor as plain column tuples
+    stmt = select(Timer.date, Timer.start_time, Timer.end_time, Timer.planned_minutes,
+                  Timer.duration_minutes, Timer.notes)\
+             .where(Timer.end_time != None)\
+             .order_by(Timer.start_time.desc())
+    
+    chunks = ([[day.strftime('%Y-%m-%d'),
+                start_time.strftime('%H:%M:%S'),
+                end_time.strftime('%H:%M:%S') if end_time else '',
+                planned_minutes,
+                duration_minutes or '',
+                notes or '']
+               for day, start_time, end_time, planned_minutes, duration_minutes, notes in rows]
+              for rows in iter_chunks(stmt))
+    
+    return stream_csv('focus_sessions.csv',
+                      ['Date', 'Start Time', 'End Time', 'Planned Minutes', 'Actual Minutes', 'Notes'],
+                      chunks)
+
+@bp.route('/projects')
+@page_cache.cached
 def projects():
-    projects = Project.query.all()
+    # Per-project summaries from a single GROUP BY instead of loading project.tasks
+    today = date.today()
+    is_open = Task.completed == False
+    projects = db.session.query(
+        Project,
+        func.sum(case((is_open, 1), else_=0)),
+        func.sum(case((is_open & (Task.due_date < today), 1), else_=0)),
+        func.sum(case((Task.completed == True, 1), else_=0)),
+        func.min(case((is_open & (Task.due_date >= today), Task.due_date))),
+    ).outerjoin(Task, Task.project_id == Project.id)\
+     .group_by(Project.id)\
+     .order_by(Project.id)\
+     .all()
+    
+    # Archived tasks only count towards the completed total
+    archived = dict(db.session.query(ArchivedTask.project_id, func.count(ArchivedTask.id))
+                              .group_by(ArchivedTask.project_id).all())
+    projects = [(project, open_count, overdue_count, completed_count + archived.get(project.id, 0), next_due)
+                for project, open_count, overdue_count, completed_count, next_due in projects]
     return render_template('projects.html', projects=projects, title="Projects")
 
-@app.route('/projects/new', methods=['GET', 'POST'])
+@bp.route('/projects/new', methods=['GET', 'POST'])
 def new_project():
     if request.method == 'POST':
         name = request.form['name']
@@ -266,21 +778,137 @@ def new_project():
         db.session.add(project)
         db.session.commit()
         
-        return redirect(url_for('projects'))
+        return redirect(url_for('.projects'))
     
     return render_template('new_project.html', title="New Project")
 
-@app.route('/projects/<int:project_id>')
+@bp.route('/projects/<int:project_id>')
 def project_tasks(project_id):
     project = Project.query.get_or_404(project_id)
-    tasks = Task.query.filter_by(project_id=project_id, completed=False)\
-                     .order_by((Task.due_date == None), Task.due_date, Task.priority.desc())\
-                     .all()
-    return render_template('project_tasks.html', project=project, tasks=tasks, title=f"{project.name} Tasks")
+    page = paginate_open_tasks(task_row_query().filter(Task.project_id == project_id, Task.completed == False))
+    projects = Project.query.all()  # For the batch "move to project" dropdown
+    return render_template('project_tasks.html', project=project, tasks=page.items, page=page,
+                         projects=projects, title=f"{project.name} Tasks")
+
+def backup_path(name):
+    """Path of a snapshot in BACKUP_DIR; name must be a bare file name"""
+    if not name or os.path.basename(name) != name or name.startswith('.'):
+        abort(400)
+    return os.path.join(current_app.config['BACKUP_DIR'], name)
+
+def database_file():
+    path = sqlite_path(db.engine)
+    if path is None:
+        abort(501)  # snapshots need an SQLite file; use the JSON Lines dump elsewhere
+    return path
+
+def take_snapshot(compress):
+    """Snapshot the live database into BACKUP_DIR, returning the file name"""
+    os.makedirs(current_app.config['BACKUP_DIR'], exist_ok=True)
+    name = datetime.now(timezone.utc).strftime('tasks-%Y%m%d-%H%M%S.db') + ('.gz' if compress else '')
+    snapshot(database_file(), backup_path(name), compress,
+             current_app.config['BACKUP_STEP_PAGES'], current_app.config['BACKUP_STEP_SLEEP'])
+    return name
+
+def admin_required(view):
+    """Only allow requests bearing ADMIN_TOKEN; the admin endpoints don't exist without one"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('ADMIN_TOKEN')
+        if not token:
+            abort(404)
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+@bp.route('/admin/backups')
+@admin_required
+def list_backups():
+    directory = current_app.config['BACKUP_DIR']
+    names = sorted(os.listdir(directory), reverse=True) if os.path.isdir(directory) else []
+    return jsonify([{'name': name, 'bytes': os.path.getsize(os.path.join(directory, name))}
+                    for name in names if name.startswith('tasks-') and not name.endswith('.part')])
+
+@bp.route('/admin/backup', methods=['POST'])
+@admin_required
+def create_backup():
+    compress = request.values.get('compress', type=int, default=int(current_app.config['BACKUP_COMPRESS']))
+    name = take_snapshot(bool(compress))
+    return jsonify({'name': name, 'bytes': os.path.getsize(backup_path(name))}), 201
+
+@bp.route('/admin/restore', methods=['POST'])
+@admin_required
+def restore_backup():
+    path = backup_path(request.values.get('name', ''))
+    if not os.path.isfile(path):
+        abort(404)
+    db_path = database_file()
+    db.session.remove()
+    try:
+        restore(path, db_path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    page_cache.invalidate()
+    return jsonify({'restored': os.path.basename(path)})
+
+@bp.route('/admin/dump')
+@admin_required
+def dump_data():
+    lines = dump_jsonl(db.session, db.metadata.sorted_tables, current_app.config['EXPORT_CHUNK_SIZE'])
+    return stream_download('tasks.jsonl', 'application/x-ndjson', lines)
+
+@bp.route('/admin/load', methods=['POST'])
+@admin_required
+def load_data():
+    stream = request.stream
+    if request.headers.get('Content-Encoding') == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream)
+    try:
+        with db.engine.begin() as connection:
+            counts = load_jsonl(connection, io.TextIOWrapper(stream, encoding='utf-8'), db.metadata.tables)
+    except (ValueError, KeyError, IntegrityError) as e:
+        return jsonify({'error': str(e)}), 400
+    page_cache.invalidate()
+    return jsonify(counts)
+
+@bp.cli.command('backup')
+@click.option('--compress/--no-compress', default=None, help='Gzip the snapshot (default: BACKUP_COMPRESS).')
+def backup_command(compress):
+    """Take an online snapshot of the database into BACKUP_DIR"""
+    if compress is None:
+        compress = current_app.config['BACKUP_COMPRESS']
+    name = take_snapshot(compress)
+    print(f"Wrote {backup_path(name)}")
+
+@bp.cli.command('restore')
+@click.argument('snapshot_file', type=click.Path(exists=True, dir_okay=False))
+def restore_command(snapshot_file):
+    """Replace the database contents with a snapshot"""
+    restore(snapshot_file, database_file())
+    page_cache.invalidate()
+    print(f"Restored {snapshot_file}")
+
+@bp.cli.command('dump')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+def dump_command(output):
+    """Write every table as JSON Lines (to stdout by default)"""
+    for lines in dump_jsonl(db.session, db.metadata.sorted_tables, current_app.config['EXPORT_CHUNK_SIZE']):
+        output.write(lines)
 
-# Create database tables
-with app.app_context():
-    db.create_all()
+@bp.cli.command('load')
+@click.argument('input', type=click.File('r', encoding='utf-8'), default='-')
+def load_command(input):
+    """Load a JSON Lines dump into an empty database (from stdin by default)"""
+    with db.engine.begin() as connection:
+        counts = load_jsonl(connection, input, db.metadata.tables)
+    page_cache.invalidate()
+    for table, count in counts.items():
+        print(f"Loaded {count} rows into {table}")
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    app = create_app()
+    with app.app_context():
+        init_schema(db.engine)  # convenient for the development server
+    app.run(debug=True, port=5001)
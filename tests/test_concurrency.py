@@ -0,0 +1,49 @@
+"""
+Parallel writers against one SQLite file under DB_PROFILE=production.
+
+Each worker process builds its own app, like a gunicorn worker, and mixes
+task adds with timer starts. With WAL and busy_timeout none of them should
+see "database is locked".
+"""
+
+import multiprocessing
+import sqlite3
+
+WORKERS = 12
+WRITES = 50
+
+
+def write(worker):
+    from tasks import create_app
+    client = create_app().test_client()
+    errors = []
+    for i in range(WRITES):
+        added = client.post('/add', data={'task': f'worker {worker} task {i}', 'do_date': '',
+                                          'due_date': '2026-01-02', 'priority': '1', 'project_id': ''})
+        started = client.post('/timer/start', data={'duration': '25'})
+        errors += [response.status_code for response in (added, started) if response.status_code != 302]
+    return errors
+
+
+def test_parallel_writers(tmp_path, monkeypatch):
+    db_path = tmp_path / 'tasks.db'
+    monkeypatch.setenv('DB_PROFILE', 'production')
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{db_path}')
+    monkeypatch.setenv('PAGE_CACHE_PATH', str(tmp_path / 'page_cache.db'))
+
+    from tasks import create_app
+    from models import db, init_schema
+    app = create_app()
+    with app.app_context():
+        init_schema(db.engine)
+        db.engine.dispose()
+
+    # spawn, so no worker inherits the parent's connections
+    with multiprocessing.get_context('spawn').Pool(WORKERS) as pool:
+        errors = pool.map(write, range(WORKERS))
+
+    assert errors == [[]] * WORKERS
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('SELECT count(*) FROM task').fetchone()[0] == WORKERS * WRITES
+        assert conn.execute('SELECT count(*) FROM timer').fetchone()[0] == WORKERS * WRITES